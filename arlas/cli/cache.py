@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from arlas.cli.variables import variables
+
+
+# On disk cache of the responses of idempotent GET requests (collection descriptions, mappings, ...).
+# An entry is a file: a first line of JSON metadata (url, time, etag) followed by the raw content of the response.
+# Entries are fresh during ttl seconds, then revalidated with their ETag if any. The least recently used entries are
+# evicted when the cache exceeds max_size bytes. Any modification sent to a configuration invalidates its entries.
+class ResponseCache:
+    enabled: bool = True
+    refresh: bool = False
+    ttl: int = 300
+    max_size: int = 50 * 1024 * 1024
+    invalidated: set[str] = set()
+    lock = threading.Lock()
+
+    @staticmethod
+    def get(arlas: str, url: str, identity: str) -> dict | None:
+        if not ResponseCache.enabled:
+            return None
+        path = ResponseCache.__path__(arlas, url, identity)
+        try:
+            with open(path, mode="rb") as f:
+                entry = json.loads(f.readline())
+                entry["content"] = f.read()
+            # The entry becomes the most recently used one
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        entry["fresh"] = not ResponseCache.refresh and time.time() - entry.get("time", 0) < ResponseCache.ttl
+        return entry
+
+    @staticmethod
+    def put(arlas: str, url: str, identity: str, content: bytes, etag: str = None):
+        if not ResponseCache.enabled:
+            return
+        with ResponseCache.lock:
+            try:
+                os.makedirs(variables["cache_directory"], mode=0o700, exist_ok=True)
+                fd = os.open(ResponseCache.__path__(arlas, url, identity), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, mode="wb") as f:
+                    f.write(json.dumps({"url": url, "time": time.time(), "etag": etag}).encode("utf-8") + b"\n")
+                    f.write(content)
+                ResponseCache.invalidated.discard(arlas)
+                ResponseCache.__evict__()
+            except OSError:
+                ...
+
+    @staticmethod
+    def invalidate(arlas: str):
+        if not ResponseCache.enabled or arlas in ResponseCache.invalidated:
+            return
+        with ResponseCache.lock:
+            prefix = ResponseCache.__prefix__(arlas)
+            for (name, path) in ResponseCache.__entries__():
+                if name.startswith(prefix):
+                    ResponseCache.__remove__(path)
+            ResponseCache.invalidated.add(arlas)
+
+    @staticmethod
+    def __evict__():
+        entries = []
+        for (_, path) in ResponseCache.__entries__():
+            try:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                ...
+        size = sum(map(lambda e: e[1], entries))
+        for (_, entry_size, path) in sorted(entries):
+            if size <= ResponseCache.max_size:
+                break
+            ResponseCache.__remove__(path)
+            size = size - entry_size
+
+    @staticmethod
+    def __entries__() -> list[tuple[str, str]]:
+        directory = variables["cache_directory"]
+        if not os.path.isdir(directory):
+            return []
+        return list(map(lambda name: (name, os.path.join(directory, name)), os.listdir(directory)))
+
+    @staticmethod
+    def __remove__(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            ...
+
+    @staticmethod
+    def __prefix__(arlas: str) -> str:
+        return hashlib.sha256(str(arlas).encode("utf-8")).hexdigest()[:16] + "-"
+
+    @staticmethod
+    def __path__(arlas: str, url: str, identity: str) -> str:
+        key = hashlib.sha256("|".join([str(arlas), url, identity]).encode("utf-8")).hexdigest()
+        return os.path.join(variables["cache_directory"], ResponseCache.__prefix__(arlas) + key)
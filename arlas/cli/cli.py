@@ -1,9 +1,12 @@
+import atexit
+import cProfile
+import pstats
 import requests
 import typer
 import os
 import sys
 
-from .service import Service
+from .service import AsyncService, Service
 from arlas.cli.user import user
 from arlas.cli.iam import iam
 from arlas.cli.org import org
@@ -12,6 +15,8 @@ from arlas.cli.configurations import configurations
 from arlas.cli.persist import persist
 from arlas.cli.index import indices
 from arlas.cli.variables import variables
+from arlas.cli.cache import ResponseCache
+from arlas.cli.trace import Trace
 from arlas.cli.settings import ARLAS, Configuration, Resource, Settings
 
 app = typer.Typer(add_completion=False, no_args_is_help=True)
@@ -22,9 +27,25 @@ arlas_cli_version = "arlas_cli_versions"
 def init(
     config_file: str = typer.Option(None, help="Path to the configuration file if you do not want to use the default one: .arlas/cli/configuration.yaml."),
     print_curl: bool = typer.Option(False, help="Print curl command"),
+    max_concurrency: int = typer.Option(8, help="Maximum number of concurrent requests sent to a same host by the commands sending many requests"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Do not use nor store cached responses (collection descriptions, mappings, ...)"),
+    refresh: bool = typer.Option(False, "--refresh", help="Do not use the cached responses, but refresh them"),
+    trace: bool = typer.Option(False, "--trace", help="Record the HTTP requests and print a summary (calls, bytes, timings) at exit"),
+    trace_file: str = typer.Option(None, help="With --trace, write the HTTP requests as Chrome trace events in this file (chrome://tracing)"),
+    profile: str = typer.Option(None, help="Run the command under cProfile and write the statistics in this file"),
     version: bool = typer.Option(False, "--version", help="Print command line version")
 ):
     Service.curl = print_curl
+    AsyncService.max_concurrency = max_concurrency
+    ResponseCache.enabled = not no_cache
+    ResponseCache.refresh = refresh
+    if trace:
+        Trace.enabled = True
+        atexit.register(__trace_at_exit, trace_file)
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        atexit.register(__profile_at_exit, profiler, profile)
     if config_file:
         variables["configuration_file"] = config_file
     if version:
@@ -62,6 +83,19 @@ def init(
         sys.exit(0)
 
 
+def __trace_at_exit(trace_file: str):
+    Trace.print_summary()
+    if trace_file:
+        Trace.write_chrome_trace(trace_file)
+
+
+def __profile_at_exit(profiler: cProfile.Profile, profile: str):
+    profiler.disable()
+    profiler.dump_stats(profile)
+    pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(20)
+    print("Profile written in {}".format(profile), file=sys.stderr)
+
+
 def main():
     try:
         json = requests.get('https://pypi.org/pypi/arlas.cli/json').json()
@@ -0,0 +1,52 @@
+import json
+
+# JSON serialization used by the command line. A fast backend is used when installed (orjson, then msgspec),
+# the standard json module otherwise. Values a fast backend can not handle (e.g. integers above 64 bits, NaN,
+# non string keys) fall back to the standard json module.
+orjson = None
+msgspec = None
+try:
+    import orjson
+    BACKEND = "orjson"
+except ImportError:
+    try:
+        import msgspec
+        BACKEND = "msgspec"
+    except ImportError:
+        BACKEND = "json"
+
+
+def loads(s: str | bytes) -> any:
+    try:
+        if orjson:
+            return orjson.loads(s)
+        if msgspec:
+            return msgspec.json.decode(s)
+    except (ValueError, msgspec.DecodeError if msgspec else ValueError):
+        ...
+    # The standard json module raises its own error if the document is really invalid
+    return json.loads(s)
+
+
+# Serializes the object as UTF-8 bytes, ready to be sent
+def dumpb(o: any) -> bytes:
+    try:
+        if orjson:
+            return orjson.dumps(o)
+        if msgspec:
+            return msgspec.json.encode(o)
+    except (TypeError, ValueError, OverflowError):
+        ...
+    return json.dumps(o, ensure_ascii=False).encode("utf-8")
+
+
+def dumps(o: any, indent: int = None) -> str:
+    try:
+        if orjson and indent in [None, 2]:
+            return orjson.dumps(o, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+        if msgspec:
+            b = msgspec.json.encode(o)
+            return (msgspec.json.format(b, indent=indent) if indent else b).decode("utf-8")
+    except (TypeError, ValueError, OverflowError):
+        ...
+    return json.dumps(o, indent=indent, ensure_ascii=False)
@@ -1,9 +1,12 @@
-import json
 import typer
 import os
 import sys
+import threading
+from alive_progress import alive_bar
 from prettytable import PrettyTable
 
+import arlas.cli.codec as codec
+from arlas.cli.export import open_writer
 from arlas.cli.settings import Configuration, Resource
 from arlas.cli.service import Service
 from arlas.cli.variables import variables
@@ -26,22 +29,59 @@ def list_collections():
 @collections.command(help="Count the number of hits within a collection (or all collection if not provided)",
                      epilog=variables["help_epilog"])
 def count(
-    collection: str = typer.Argument(default=None, help="Collection's name")
+    collection: str = typer.Argument(default=None, help="Collection's name"),
+    stream: bool = typer.Option(default=False, help="Print the counts as they are received (tab separated), instead of a table at the end"),
+    by_index: bool = typer.Option(default=False, help="Count the collections without filter with one elasticsearch count per index. The counts are the ones of the indices: the ARLAS permissions are not applied.")
 ):
     config = variables["arlas"]
-    count = Service.count_collection(config, collection)
+    if stream:
+        print("collection name\tcount")
+        Service.count_collection(config, collection, by_index=by_index, on_count=lambda row: print("{}\t{}".format(row[0], row[1]), flush=True))
+        return
+    count = Service.count_collection(config, collection, by_index=by_index)
     __print_table(count[0], count[1:], sortby="collection name")
 
 
 @collections.command(help="Describe a collection", epilog=variables["help_epilog"])
 def describe(
-    collection: str = typer.Argument(help="Collection's name")
+    collection: str = typer.Argument(default=None, help="Collection's name"),
+    all: bool = typer.Option(default=False, help="Describe all the collections in a report"),
+    pattern: str = typer.Option(default=None, help="Describe the collections matching the pattern (e.g. 'courses_*') in a report"),
+    format: str = typer.Option(default="json", help="Format of the report: json (one array) or ndjson (one collection per line)"),
+    output: str = typer.Option(default=None, help="Path of the file receiving the report. Default is the standard output")
 ):
     config = variables["arlas"]
-    fields = Service.describe_collection(config, collection)
+    if all or pattern:
+        if format not in ["json", "ndjson"]:
+            print("Error: unknown report format {}, json or ndjson expected".format(format), file=sys.stderr)
+            exit(1)
+        report = []
+        for description in Service.get_collection_descriptions(config, pattern if pattern else "*"):
+            name = description.get("collection_name")
+            report.append({
+                "collection": name,
+                "params": description.get("params", {}),
+                "fields": dict(Service.describe_collection(config, name, description)[1:])
+            })
+        f = open(output, mode="w", encoding="utf-8") if output else sys.stdout
+        try:
+            if format == "ndjson":
+                for line in report:
+                    f.write(codec.dumps(line) + "\n")
+            else:
+                f.write(codec.dumps(report, indent=2) + "\n")
+        finally:
+            if output:
+                f.close()
+        return
+    if collection is None:
+        print("Error: a collection name, --all or --pattern is required", file=sys.stderr)
+        exit(1)
+    description = Service.get_collection_description(config, collection)
+    fields = Service.describe_collection(config, collection, description)
     __print_table(fields[0], fields[1:], sortby="field name")
 
-    fields = Service.metadata_collection(config, collection)
+    fields = Service.metadata_collection(config, collection, description)
     __print_table(fields[0], fields[1:], sortby=None)
 
 
@@ -108,11 +148,51 @@ def set_field_display_name(
 def sample(
     collection: str = typer.Argument(help="Collection's name"),
     pretty: bool = typer.Option(default=True),
-    size: int = typer.Option(default=10)
+    size: int = typer.Option(default=10),
+    stream: bool = typer.Option(default=False, help="Write the hits as they are received, one JSON per line (NDJSON), instead of loading the whole response"),
+    output: str = typer.Option(default=None, help="With --stream, path of the file receiving the hits. Default is the standard output")
 ):
     config = variables["arlas"]
+    if stream:
+        f = open(output, mode="w", encoding="utf-8") if output else sys.stdout
+        try:
+            for hit in Service.stream_sample_collection(config, collection, size=size):
+                f.write(codec.dumps(hit) + "\n")
+        finally:
+            if output:
+                f.close()
+        return
     sample = Service.sample_collection(config, collection, pretty=pretty, size=size)
-    print(json.dumps(sample.get("hits", []), indent=2 if pretty else None))
+    print(codec.dumps(sample.get("hits", []), indent=2 if pretty else None))
+
+
+@collections.command(help="Export all the hits of a collection in a file", epilog=variables["help_epilog"])
+def export(
+    collection: str = typer.Argument(help="Collection's name"),
+    format: str = typer.Option(default="ndjson", help="Format of the file: ndjson, geojson or parquet (requires pyarrow)"),
+    output: str = typer.Option(default=None, help="Path of the file. Default is <collection>.<format>"),
+    filter: list[str] = typer.Option(default=[], help="ARLAS filter expression (e.g. 'type:eq:river'). Can be repeated, the filters are combined."),
+    partitions: int = typer.Option(default=1, help="Number of timestamp ranges exported in parallel. Requires a collection with a timestamp path."),
+    page_size: int = typer.Option(default=1000, help="Number of hits per request")
+):
+    config = variables["arlas"]
+    writer = open_writer(format, output if output else "{}.{}".format(collection, format))
+    total = Service.count_collection_hits(config, collection, filter)
+    lock = threading.Lock()
+    with alive_bar(total) as bar:
+        def write(hit: dict):
+            writer.write(hit)
+            with lock:
+                bar()
+        try:
+            Service.export_collection(config, collection, write, filters=filter, partitions=partitions, page_size=page_size)
+        finally:
+            writer.close()
+    print("{} hits exported in {}".format(writer.count, output if output else "{}.{}".format(collection, format)))
+    if writer.count != total:
+        # Hits without timestamp are in none of the partitions
+        print("Error: {} hits expected{}".format(total, ", the hits without timestamp are not exported with --partitions" if partitions > 1 else ""), file=sys.stderr)
+        exit(1)
 
 
 @collections.command(help="Delete a collection", epilog=variables["help_epilog"])
@@ -0,0 +1,126 @@
+import gzip
+import sys
+import threading
+
+import arlas.cli.codec as codec
+
+EXPORT_FORMATS = ["ndjson", "geojson", "parquet"]
+PARQUET_BATCH_SIZE = 10000
+
+
+# Writers of the exported hits. The hits are written as they are received: a writer can be shared by several
+# threads (e.g. one per partition of an export), it serializes the writes.
+class NDJSONWriter:
+    def __init__(self, path: str, compress: bool = False):
+        self.lock = threading.Lock()
+        self.count = 0
+        if compress or path.endswith(".gz"):
+            self.f = gzip.open(path, mode="wb")
+        else:
+            self.f = open(path, mode="wb")
+
+    def write(self, hit: dict):
+        line = codec.dumpb(hit) + b"\n"
+        with self.lock:
+            self.f.write(line)
+            self.count = self.count + 1
+
+    def close(self):
+        self.f.close()
+
+
+# Writes ARLAS hits ({"md": ..., "data": ...}) as the features of a FeatureCollection. The geometry is the one of the
+# collection (md.geometry), or its centroid (md.centroid) if the collection has no geometry.
+class GeoJSONWriter:
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.f = open(path, mode="wb")
+        self.f.write(b'{"type": "FeatureCollection", "features": [\n')
+
+    def write(self, hit: dict):
+        md = hit.get("md", {})
+        feature = {
+            "type": "Feature",
+            "id": md.get("id"),
+            "geometry": md.get("geometry", md.get("centroid")),
+            "properties": hit.get("data", {})
+        }
+        line = codec.dumpb(feature)
+        with self.lock:
+            self.f.write(line if self.count == 0 else b",\n" + line)
+            self.count = self.count + 1
+
+    def close(self):
+        self.f.write(b"\n]}\n")
+        self.f.close()
+
+
+# Writes the data of ARLAS hits as the rows of a parquet file, with one column per field (e.g. "a.b" for {"a": {"b": 1}}).
+# The schema is the one of the first rows: fields that appear later are ignored. Requires pyarrow.
+class ParquetWriter:
+    def __init__(self, path: str):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            print("Error: the parquet format requires pyarrow (pip install pyarrow)", file=sys.stderr)
+            exit(1)
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
+        self.rows = []
+        self.writer = None
+
+    def write(self, hit: dict):
+        row = {}
+        __flatten__(hit.get("data", {}), "", row)
+        with self.lock:
+            self.rows.append(row)
+            self.count = self.count + 1
+            if len(self.rows) >= PARQUET_BATCH_SIZE:
+                self.__flush__()
+
+    def close(self):
+        self.__flush__()
+        if self.writer:
+            self.writer.close()
+
+    def __flush__(self):
+        if len(self.rows) == 0:
+            return
+        try:
+            if self.writer is None:
+                table = self.pa.Table.from_pylist(self.rows)
+                self.writer = self.pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = self.pa.Table.from_pylist(self.rows, schema=self.writer.schema)
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError) as e:
+            print("Error: the hits can not be written in parquet ({}). Use the ndjson format instead.".format(e), file=sys.stderr)
+            exit(1)
+        self.writer.write_table(table)
+        self.rows = []
+
+
+def open_writer(format: str, path: str):
+    if format == "ndjson":
+        return NDJSONWriter(path)
+    if format == "geojson":
+        return GeoJSONWriter(path)
+    if format == "parquet":
+        return ParquetWriter(path)
+    print("Error: unknown export format {}, one of {} expected".format(format, ", ".join(EXPORT_FORMATS)), file=sys.stderr)
+    exit(1)
+
+
+# Objects become columns, arrays of objects are kept as JSON strings
+def __flatten__(o: dict, prefix: str, row: dict):
+    for (k, v) in o.items():
+        if type(v) is dict:
+            __flatten__(v, prefix + k + ".", row)
+        elif type(v) is list and any(type(x) in [dict, list] for x in v):
+            row[prefix + k] = codec.dumps(v)
+        else:
+            row[prefix + k] = v
@@ -1,12 +1,21 @@
+import itertools
 import json
 import typer
 import os
+import re
 import sys
+import threading
+from alive_progress import alive_bar
 from prettytable import PrettyTable
 
+import arlas.cli.codec as codec
+from arlas.cli.export import NDJSONWriter
+from arlas.cli.index_advisor import estimate_files, recommend_settings
+from arlas.cli.routing import make_routing
 from arlas.cli.settings import Configuration, Resource
 from arlas.cli.service import Service
-from arlas.cli.model_infering import make_mapping
+from arlas.cli.model_infering import make_mapping, make_mapping_from_hits
+from arlas.cli.validation import make_validator
 from arlas.cli.variables import variables
 
 indices = typer.Typer()
@@ -18,13 +27,16 @@ def configuration(config: str = typer.Option(default=None, help="Name of the ARL
 
 
 @indices.command(help="List indices", name="list", epilog=variables["help_epilog"])
-def list_indices():
+def list_indices(
+    pattern: str = typer.Argument(default=None, help="Only list the indices matching the pattern (e.g. 'courses*')"),
+    sort: str = typer.Option(default="name", help="Sort the indices by name, count (descending) or size (descending)"),
+    top: int = typer.Option(default=None, help="Only list the first indices, once sorted")
+):
     config = variables["arlas"]
-    indices = Service.list_indices(config)
-    tab = PrettyTable(indices[0], sortby="name", align="l")
-    tab.add_rows(indices[1:])
-    print(tab)
-    print(f"Total count: {sum([int(index_info[2]) for index_info in indices[1:]])}")
+    indices = Service.list_indices(config, pattern=pattern, sort=sort, top=top)
+    __print_indices(indices)
+    print("Total count: {}".format(sum(map(lambda index: index[2], indices[1:]))))
+    print("Total size: {}".format(__human_size(sum(map(lambda index: index[3], indices[1:])))))
 
 
 @indices.command(help="Describe an index", epilog=variables["help_epilog"])
@@ -41,13 +53,14 @@ def describe(
 @indices.command(help="Clone an index and set its name", epilog=variables["help_epilog"])
 def clone(
     source: str = typer.Argument(help="Source index name"),
-    target: str = typer.Argument(help="Target cloned index name")
+    target: str = typer.Argument(help="Target cloned index name"),
+    split: int = typer.Option(default=None, help="Number of shards of the target, a multiple of the number of shards of the source (split instead of clone)"),
+    wait_for_status: str = typer.Option(default="yellow", help="Health status (yellow or green) of the target to wait for"),
+    timeout: int = typer.Option(default=600, help="Maximum number of seconds to wait for the target health status")
 ):
     config = variables["arlas"]
-    indices = Service.clone_index(config, source, target)
-    tab = PrettyTable(indices[0], sortby="name", align="l")
-    tab.add_rows(indices[1:])
-    print(tab)
+    indices = Service.clone_index(config, source, target, split=split, wait_for_status=wait_for_status, timeout=timeout)
+    __print_indices(indices)
 
 
 @indices.command(help="Migrate an index on another arlas configuration, and set the target index name",
@@ -55,31 +68,135 @@ def clone(
 def migrate(
     source: str = typer.Argument(help="Source index name"),
     arlas_target: str = typer.Argument(help="Target ARLAS Configuration name"),
-    target: str = typer.Argument(help="Target migrated index name")
+    target: str = typer.Argument(help="Target migrated index name"),
+    requests_per_second: float = typer.Option(default=None, help="Throttles the copy to that number of documents per second"),
+    client_side: bool = typer.Option(default=False, help="Copy the documents through the command line (read from the source, bulk in the target) instead of a reindex from remote"),
+    slices: int = typer.Option(default=4, help="With --client-side, number of slices copied in parallel"),
+    checkpoints: str = typer.Option(default=None, help="With --client-side, directory of the checkpoints used to resume an interrupted copy. Default is <target>.checkpoints"),
+    via_snapshot: str = typer.Option(default=None, help="Copy the index with a snapshot in that repository, restored in the target configuration"),
+    repository_location: str = typer.Option(default=None, help="With --via-snapshot, registers the repository as a shared file system repository at that location on both configurations"),
+    keep_snapshot: bool = typer.Option(default=False, help="With --via-snapshot, keep the snapshot once restored")
 ):
     config = variables["arlas"]
-    indices = Service.migrate_index(config, source, arlas_target, target)
-    tab = PrettyTable(indices[0], sortby="name", align="l")
-    tab.add_rows(indices[1:])
-    print(tab)
+    if via_snapshot:
+        indices = Service.migrate_index_via_snapshot(config, source, arlas_target, target, via_snapshot, location=repository_location, keep_snapshot=keep_snapshot)
+    elif client_side:
+        indices = Service.migrate_index_client_side(config, source, arlas_target, target, slices=slices, checkpoints=checkpoints)
+    else:
+        indices = Service.migrate_index(config, source, arlas_target, target, requests_per_second=requests_per_second)
+    __print_indices(indices)
+
+
+@indices.command(help="Export all the documents of an index in NDJSON files", epilog=variables["help_epilog"])
+def export(
+    index: str = typer.Argument(help="index's name"),
+    output: str = typer.Option(default=None, help="Path of the file. Default is <index>.ndjson (<index>.ndjson.gz if compressed)"),
+    slices: int = typer.Option(default=1, help="Number of slices of the index read in parallel"),
+    per_slice: bool = typer.Option(default=False, help="Write one file per slice (e.g. <index>.<slice>.ndjson) instead of a single file"),
+    compress: bool = typer.Option(default=False, help="Compress the files with gzip"),
+    with_id: bool = typer.Option(default=False, help="Write the documents with their id ({\"_id\": ..., \"_source\": ...}) instead of their source only"),
+    page_size: int = typer.Option(default=1000, help="Number of documents per request"),
+    keep_alive: str = typer.Option(default="5m", help="How long the point in time is kept between two requests")
+):
+    config = variables["arlas"]
+    if not output:
+        output = index + ".ndjson" + (".gz" if compress else "")
+    if per_slice:
+        writers = [NDJSONWriter(__slice_path(output, i), compress=compress) for i in range(slices)]
+    else:
+        writers = [NDJSONWriter(output, compress=compress)] * slices
+    lock = threading.Lock()
+    with alive_bar(Service.count_index_hits(config, index)) as bar:
+        def write(slice: int, hit: dict):
+            writers[slice].write(hit if with_id else hit.get("_source", {}))
+            with lock:
+                bar()
+        try:
+            Service.export_index(config, index, write, slices=slices, page_size=page_size, keep_alive=keep_alive)
+        finally:
+            for writer in set(writers):
+                writer.close()
+    print("{} documents exported in {}".format(sum(map(lambda w: w.count, set(writers))), __slice_path(output, "[0-{}]".format(slices - 1)) if per_slice else output))
 
 
 @indices.command(help="Display a sample of an index", epilog=variables["help_epilog"])
 def sample(
     index: str = typer.Argument(help="index's name"),
     pretty: bool = typer.Option(default=True),
-    size: int = typer.Option(default=10)
+    size: int = typer.Option(default=10),
+    stream: bool = typer.Option(default=False, help="Write the hits as they are received, one JSON per line (NDJSON), instead of loading the whole response"),
+    output: str = typer.Option(default=None, help="With --stream, path of the file receiving the hits. Default is the standard output")
 ):
     config = variables["arlas"]
+    if stream:
+        f = open(output, mode="w", encoding="utf-8") if output else sys.stdout
+        try:
+            for hit in Service.stream_sample_index(config, index, size=size):
+                f.write(codec.dumps(hit) + "\n")
+        finally:
+            if output:
+                f.close()
+        return
     sample = Service.sample_index(config, index, pretty=pretty, size=size)
-    print(json.dumps(sample["hits"].get("hits", []), indent=2 if pretty else None))
+    print(codec.dumps(sample["hits"].get("hits", []), indent=2 if pretty else None))
+
+
+@indices.command(help="Reload the data behind an alias: the data is indexed in a new index, then the alias is moved to it", epilog=variables["help_epilog"])
+def reload(
+    alias: str = typer.Argument(help="alias's name, referenced by the collections"),
+    files: list[str] = typer.Argument(help="List of paths to the file(s) containing the data. Format: NDJSON"),
+    bulk: int = typer.Option(default=5000, help="Bulk size for indexing data"),
+    mapping: str = typer.Option(default=None, help="For the first load, when the alias does not exist yet: name of the mapping within your configuration, or URL or file path"),
+    delete_old: bool = typer.Option(default=False, help="Delete the indices previously behind the alias"),
+    convert: bool = typer.Option(default=False, help="If the alias is still an index, replace that index by the alias once the data is reloaded (the index is deleted)")
+):
+    config = variables["arlas"]
+    for file in files:
+        if not os.path.exists(file):
+            print("Error: file \"{}\" not found.".format(file), file=sys.stderr)
+            exit(1)
+    # The deletions are confirmed before loading the data
+    old_indices = Service.get_alias_indices(config, alias)
+    if len(old_indices) == 0 and Service.index_exists(config, alias):
+        if not convert:
+            print("Error: {} is an index, not an alias. Use --convert to replace the index by an alias on the reloaded data.".format(alias), file=sys.stderr)
+            exit(1)
+        if not __confirm_delete(config, "the index '{}', replaced by an alias once reloaded,".format(alias), alias):
+            return
+    elif delete_old and len(old_indices) > 0:
+        if not __confirm_delete(config, "the indices {} behind '{}' once reloaded,".format(", ".join(old_indices), alias), alias):
+            return
+    mapping_resource = None
+    if mapping:
+        mapping_resource = Configuration.settings.mappings.get(mapping, None)
+        if not mapping_resource:
+            if os.path.exists(mapping):
+                mapping_resource = Resource(location=mapping)
+            else:
+                print("Error: mapping {} not found".format(mapping), file=sys.stderr)
+                exit(1)
+    (index, old_indices, restore) = Service.create_reload_index(config, alias, mapping_resource, convert=convert)
+    print("Index {} created on {}".format(index, config))
+    i = 1
+    for file in files:
+        print("Processing file {}/{} ...".format(i, len(files)))
+        count = Service.count_hits(file_path=file)
+        Service.index_hits(config, index=index, file_path=file, bulk_size=bulk, count=count)
+        i = i + 1
+    Service.switch_alias(config, alias, index, old_indices, restore, delete_old=delete_old)
+    print("{} now points to {}".format(alias, index))
+    if len(old_indices) > 0:
+        print("{} {}".format(", ".join(old_indices), "deleted" if delete_old or old_indices == [alias] else "kept"))
 
 
 @indices.command(help="Create an index", epilog=variables["help_epilog"])
 def create(
     index: str = typer.Argument(help="index's name"),
     mapping: str = typer.Option(help="Name of the mapping within your configuration, or URL or file path"),
-    shards: int = typer.Option(default=1, help="Number of shards for the index")
+    shards: int = typer.Option(default=1, help="Number of shards for the index"),
+    auto_settings: list[str] = typer.Option(default=[], help="Path of a data file (NDJSON) to be indexed: the shards, replicas, refresh interval and codec are chosen from the data volume and the cluster. Can be repeated. Overrides --shards."),
+    dry_run: bool = typer.Option(default=False, help="Only display the settings chosen with --auto-settings, the index is not created"),
+    routing_partition_size: int = typer.Option(default=None, help="Number of shards a routing value can go to (less than the number of shards). The documents must then be indexed with a routing (see data --routing).")
 ):
     config = variables["arlas"]
     mapping_resource = Configuration.settings.mappings.get(mapping, None)
@@ -89,30 +206,88 @@ def create(
         else:
             print("Error: model {} not found".format(mapping), file=sys.stderr)
             exit(1)
+    settings = __advise_settings(config, auto_settings) if len(auto_settings) > 0 else None
+    if routing_partition_size:
+        number_of_shards = (settings or {}).get("number_of_shards", shards)
+        if routing_partition_size >= number_of_shards:
+            print("Error: the routing partition size ({}) must be less than the number of shards ({})".format(routing_partition_size, number_of_shards), file=sys.stderr)
+            exit(1)
+        settings = {**(settings or {}), "routing_partition_size": routing_partition_size}
+    if dry_run:
+        return
     Service.create_index_from_resource(
         config,
         index=index,
         mapping_resource=mapping_resource,
-        number_of_shards=shards)
+        number_of_shards=shards,
+        settings=settings)
     print("Index {} created on {}".format(index, config))
 
 
 @indices.command(help="Index data", epilog=variables["help_epilog"])
 def data(
     index: str = typer.Argument(help="index's name"),
-    files: list[str] = typer.Argument(help="List of paths to the file(s) containing the data. Format: NDJSON"),
-    bulk: int = typer.Option(default=5000, help="Bulk size for indexing data")
+    files: list[str] = typer.Argument(help="List of paths to the file(s) containing the data, or '-' for the standard input. Format: NDJSON"),
+    bulk: int = typer.Option(default=5000, help="Bulk size for indexing data"),
+    create_mapping: bool = typer.Option(default=False, help="Infer the mapping from the first lines of the first file and create the index before indexing the data. The input is read only once."),
+    nb_lines: int = typer.Option(default=2, help="With --create-mapping, number of lines to consider for generating the mapping."),
+    buffer_size: int = typer.Option(default=10 * 1024 * 1024, help="With --create-mapping, maximum number of bytes buffered for generating the mapping."),
+    field_mapping: list[str] = typer.Option(default=[], help="With --create-mapping, override the mapping with the provided field path/type. Example: fragment.location:geo_point. Important: the full field path must be provided."),
+    no_fulltext: list[str] = typer.Option(default=[], help="With --create-mapping, list of keyword or text fields that should not be in the fulltext search. Important: the field name only must be provided."),
+    no_index: list[str] = typer.Option(default=[], help="With --create-mapping, list of fields that should not be indexed."),
+    shards: int = typer.Option(default=1, help="With --create-mapping, number of shards for the index"),
+    validate: bool = typer.Option(default=False, help="Check the documents against the mapping of the index before sending them. Invalid documents are written in the reject file."),
+    reject_file: str = typer.Option(default=None, help="With --validate, path to the file receiving the invalid documents. Default is {index}_rejected.json"),
+    routing: str = typer.Option(default=None, help="Route the documents to the shards by the value of a field (full field path), or by the geohash of the centroid of a geometry (geohash:<precision>, e.g. geohash:3)"),
+    routing_geometry: str = typer.Option(default=None, help="With --routing geohash:<precision>, full path of the geometry field (e.g. track.trail)")
 ):
     config = variables["arlas"]
-    i = 1
+    route = make_routing(routing, routing_geometry) if routing else None
     for file in files:
-        if not os.path.exists(file):
+        if file != "-" and not os.path.exists(file):
             print("Error: file \"{}\" not found.".format(file), file=sys.stderr)
             exit(1)
+    types = __parse_field_mapping(field_mapping)
+    validator = None
+    rejects = None
+    nb_rejected = 0
+    if validate:
+        if not create_mapping:
+            validator = make_validator(Service.get_index_properties(config, index))
+        rejects = open(reject_file or "{}_rejected.json".format(index), mode="w", encoding="utf-8")
+    i = 1
+    for file in files:
         print("Processing file {}/{} ...".format(i, len(files)))
-        count = Service.count_hits(file_path=file)
-        Service.index_hits(config, index=index, file_path=file, bulk_size=bulk, count=count)
+        f = sys.stdin if file == "-" else open(file, mode="r", encoding="utf-8")
+        try:
+            lines = f
+            # Counting the lines would require an extra read of the input
+            count = None if file == "-" or (create_mapping and i == 1) else Service.count_hits(file_path=file)
+            if create_mapping and i == 1:
+                # The first lines are buffered for inferring the mapping, then indexed along with the rest of the input
+                buffer = []
+                buffer_bytes = 0
+                for line in f:
+                    buffer.append(line)
+                    buffer_bytes = buffer_bytes + len(line)
+                    if len(buffer) >= nb_lines or buffer_bytes >= buffer_size:
+                        break
+                mapping = make_mapping_from_hits(list(map(lambda line: codec.loads(line), buffer)), types=types,
+                                                 no_fulltext=no_fulltext, no_index=no_index)
+                Service.create_index(config, index=index, mapping=mapping, number_of_shards=shards)
+                print("Index {} created on {}".format(index, config))
+                if validate:
+                    validator = make_validator(Service.get_index_properties(config, index))
+                lines = itertools.chain(buffer, f)
+            nb_rejected = nb_rejected + Service.index_lines(config, index=index, lines=lines, bulk_size=bulk, count=count,
+                                                            validator=validator, rejects=rejects, routing=route)
+        finally:
+            if f is not sys.stdin:
+                f.close()
         i = i + 1
+    if rejects:
+        rejects.close()
+        print("{} document(s) rejected, written in {}".format(nb_rejected, rejects.name))
 
 
 @indices.command(help="Generate the mapping based on the data", epilog=variables["help_epilog"])
@@ -122,31 +297,42 @@ def mapping(
     field_mapping: list[str] = typer.Option(default=[], help="Override the mapping with the provided field path/type. Example: fragment.location:geo_point. Important: the full field path must be provided."),
     no_fulltext: list[str] = typer.Option(default=[], help="List of keyword or text fields that should not be in the fulltext search. Important: the field name only must be provided."),
     no_index: list[str] = typer.Option(default=[], help="List of fields that should not be indexed."),
+    no_norms: list[str] = typer.Option(default=[], help="List of text fields that do not need scoring (norms are disabled). Important: the field name only must be provided."),
+    no_doc_values: list[str] = typer.Option(default=[], help="List of fields that are never aggregated nor sorted (doc values are disabled). Important: the field name only must be provided."),
+    field_profile: str = typer.Option(default=None, help="Path to a JSON file giving, per full field path, the index/doc_values/norms options. Example: {\"fragment.comment\": {\"index\": false, \"doc_values\": false}}"),
+    narrow_numbers: bool = typer.Option(default=False, help="Use the observed ranges and precision of the numbers to pick the narrowest numeric types (byte, short, integer, half_float, float, scaled_float). Warning: later decimal numbers more precise than the observed ones are silently rounded by elasticsearch."),
+    nested: bool = typer.Option(default=False, help="Map the arrays of objects as nested objects instead of flattened objects."),
+    max_nested_depth: int = typer.Option(default=3, help="Maximum number of levels of arrays of objects. Deeper arrays of objects are kept in the source but not indexed."),
+    max_fields: int = typer.Option(default=1000, help="Maximum number of fields in the mapping. Other fields are not indexed."),
     push_on: str = typer.Option(default=None, help="Push the generated mapping for the provided index name"),
+    auto_settings: bool = typer.Option(default=False, help="With --push-on, choose the shards, replicas, refresh interval and codec of the index from the size of the file and the cluster"),
+    dry_run: bool = typer.Option(default=False, help="With --auto-settings, only display the chosen settings, the index is not created"),
 ):
     config = variables["arlas"]
     if not os.path.exists(file):
         print("Error: file \"{}\" not found.".format(file), file=sys.stderr)
         exit(1)
-    types = {}
-    for fm in field_mapping:
-        tmp = fm.split(":")
-        if len(tmp) == 2:
-            types[tmp[0]] = tmp[1]
-        else:
-            if tmp[1].startswith("date-"):
-                # Dates can have format patterns containing ':'
-                tmp = fm.split(":", 1)
-                types[tmp[0]] = tmp[1]
-            else:
-                print(f"Error: invalid field_mapping \"{fm}\". The format is \"field:type\" like \"fragment.location:geo_point\"", file=sys.stderr)
-                exit(1)
-    mapping = make_mapping(file=file, nb_lines=nb_lines, types=types, no_fulltext=no_fulltext, no_index=no_index)
+    profile = {}
+    if field_profile:
+        if not os.path.exists(field_profile):
+            print("Error: field profile \"{}\" not found.".format(field_profile), file=sys.stderr)
+            exit(1)
+        with open(field_profile, mode="r", encoding="utf-8") as f:
+            profile = json.load(f)
+    types = __parse_field_mapping(field_mapping)
+    mapping = make_mapping(file=file, nb_lines=nb_lines, types=types, no_fulltext=no_fulltext, no_index=no_index,
+                           narrow_numbers=narrow_numbers, no_norms=no_norms, no_doc_values=no_doc_values,
+                           field_profile=profile, nested_objects=nested, max_nested_depth=max_nested_depth,
+                           max_fields=max_fields)
     if push_on and config:
+        settings = __advise_settings(config, [file]) if auto_settings else None
+        if dry_run:
+            return
         Service.create_index(
             config,
             index=push_on,
-            mapping=mapping)
+            mapping=mapping,
+            settings=settings)
         print("Index {} created on {}".format(push_on, config))
     else:
         print(json.dumps(mapping, indent=2))
@@ -157,19 +343,131 @@ def delete(
     index: str = typer.Argument(help="index's name")
 ):
     config = variables["arlas"]
+    if __confirm_delete(config, "the index '{}'".format(index), index):
+        Service.delete_index(
+            config,
+            index=index)
+        print("{} has been deleted on {}.".format(index, config))
+
+
+@indices.command(help="Update the documents of an index matching a query", name="update-by-query", epilog=variables["help_epilog"])
+def update_by_query(
+    index: str = typer.Argument(help="index's name"),
+    query: list[str] = typer.Option(help="Query: a JSON elasticsearch query, 'field:value' or 'field:[from TO to]' (* for no bound). Can be repeated, the queries are combined."),
+    script: str = typer.Option(default=None, help="Painless script applied to the documents (e.g. \"ctx._source.type = 'river'\"). Without script, the documents are reindexed as they are."),
+    requests_per_second: float = typer.Option(default=None, help="Throttle the update to this number of documents per second")
+):
+    config = variables["arlas"]
+    response = Service.update_by_query(config, index, __parse_query(query), script=script, requests_per_second=requests_per_second)
+    print("{} documents updated in {}s".format(response.get("updated", 0), round(response.get("took", 0) / 1000)))
+
+
+@indices.command(help="Delete the documents of an index matching a query", name="delete-by-query", epilog=variables["help_epilog"])
+def delete_by_query(
+    index: str = typer.Argument(help="index's name"),
+    query: list[str] = typer.Option(help="Query: a JSON elasticsearch query, 'field:value' or 'field:[from TO to]' (* for no bound). Can be repeated, the queries are combined."),
+    requests_per_second: float = typer.Option(default=None, help="Throttle the deletion to this number of documents per second")
+):
+    config = variables["arlas"]
+    es_query = __parse_query(query)
+    if __confirm_delete(config, "the documents of '{}' matching {}".format(index, codec.dumps(es_query)), index):
+        response = Service.delete_by_query(config, index, es_query, requests_per_second=requests_per_second)
+        print("{} documents deleted in {}s".format(response.get("deleted", 0), round(response.get("took", 0) / 1000)))
+
+
+def __confirm_delete(config: str, what: str, index: str) -> bool:
     if not Configuration.settings.arlas.get(config).allow_delete:
         print("Error: delete on \"{}\" is not allowed. To allow delete, change your configuration file ({}).".format(config, variables["configuration_file"]), file=sys.stderr)
         exit(1)
 
-    if typer.confirm("You are about to delete the index '{}' on  '{}' configuration.\n".format(index, config),
+    if typer.confirm("You are about to delete {} on  '{}' configuration.\n".format(what, config),
                      prompt_suffix="Do you want to continue (del {} on {})?".format(index, config),
                      default=False, ):
         if config != "local" and config.find("test") < 0:
             if typer.prompt("WARNING: You are not on a test environment. To delete {} on {}, type the name of the configuration ({})".format(index, config, config)) != config:
                 print("Error: delete on \"{}\" cancelled.".format(config), file=sys.stderr)
                 exit(1)
+        return True
+    return False
 
-        Service.delete_index(
-            config,
-            index=index)
-        print("{} has been deleted on {}.".format(index, config))
+
+def __advise_settings(config: str, files: list[str]) -> dict:
+    (size, documents) = estimate_files(files)
+    data_nodes = Service.count_data_nodes(config)
+    (settings, reasons) = recommend_settings(size, documents, data_nodes)
+    print("{} of data, about {} documents, {} data node(s)".format(__human_size(size), documents, data_nodes))
+    tab = PrettyTable(["setting", "value", "reason"], align="l")
+    tab.add_rows(list(map(lambda setting: [setting, settings[setting], reasons[setting]], settings.keys())))
+    print(tab)
+    return settings
+
+
+# Builds an elasticsearch query from JSON queries, 'field:value' or 'field:[from TO to]' ({} for exclusive bounds)
+def __parse_query(queries: list[str]) -> dict:
+    clauses = []
+    for q in queries:
+        if q.strip().startswith("{"):
+            try:
+                clause = json.loads(q)
+            except json.JSONDecodeError as e:
+                print("Error: invalid JSON query \"{}\": {}".format(q, e), file=sys.stderr)
+                exit(1)
+            clauses.append(clause.get("query", clause))
+            continue
+        m = re.match(r"^([^:]+):([\[{])(.+) TO (.+)([\]}])$", q.strip())
+        if m:
+            (field, lower, gte, lte, upper) = m.groups()
+            bounds = {}
+            if gte.strip() != "*":
+                bounds["gte" if lower == "[" else "gt"] = gte.strip()
+            if lte.strip() != "*":
+                bounds["lte" if upper == "]" else "lt"] = lte.strip()
+            clauses.append({"range": {field.strip(): bounds}})
+            continue
+        tmp = q.split(":", 1)
+        if len(tmp) != 2 or not tmp[0].strip():
+            print("Error: invalid query \"{}\". The format is a JSON query, \"field:value\" or \"field:[from TO to]\"".format(q), file=sys.stderr)
+            exit(1)
+        clauses.append({"match": {tmp[0].strip(): tmp[1].strip()}})
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"bool": {"filter": clauses}}
+
+
+def __parse_field_mapping(field_mapping: list[str]) -> dict[str, str]:
+    types = {}
+    for fm in field_mapping:
+        tmp = fm.split(":")
+        if len(tmp) == 2:
+            types[tmp[0]] = tmp[1]
+        else:
+            if len(tmp) > 2 and tmp[1].startswith("date-"):
+                # Dates can have format patterns containing ':'
+                tmp = fm.split(":", 1)
+                types[tmp[0]] = tmp[1]
+            else:
+                print(f"Error: invalid field_mapping \"{fm}\". The format is \"field:type\" like \"fragment.location:geo_point\"", file=sys.stderr)
+                exit(1)
+    return types
+
+
+# Path of the file of a slice: the slice number is inserted before the extension (e.g. courses.2.ndjson.gz)
+def __slice_path(path: str, slice: int | str) -> str:
+    (root, extension) = os.path.splitext(path)
+    if extension == ".gz":
+        (root, inner_extension) = os.path.splitext(root)
+        extension = inner_extension + extension
+    return "{}.{}{}".format(root, slice, extension)
+
+
+def __print_indices(indices: list[list]):
+    tab = PrettyTable(indices[0], align="l")
+    tab.add_rows(list(map(lambda index: [index[0], index[1], index[2], __human_size(index[3])], indices[1:])))
+    print(tab)
+
+
+def __human_size(size: int) -> str:
+    for unit in ["b", "kb", "mb", "gb", "tb"]:
+        if size < 1024 or unit == "tb":
+            return "{}{}".format(size if unit == "b" else round(size, 1), unit)
+        size = size / 1024
@@ -0,0 +1,61 @@
+import math
+import os
+import sys
+
+# Rules of thumb used to size an index from the data to be indexed
+SAMPLE_LINES = 1000
+SHARD_TARGET_SIZE = 30 * 1024 ** 3
+SHARD_MAX_DOCUMENTS = 200_000_000
+BULK_REFRESH_SIZE = 1024 ** 3
+COMPRESSION_SIZE = 10 * 1024 ** 3
+
+
+# Estimates the size (bytes) and the number of documents of NDJSON files. The number of documents is the size of the
+# file divided by the average length of its first lines.
+def estimate_files(files: list[str]) -> tuple[int, int]:
+    size = 0
+    documents = 0
+    for file in files:
+        if not os.path.exists(file):
+            print("Error: file \"{}\" not found.".format(file), file=sys.stderr)
+            exit(1)
+        file_size = os.path.getsize(file)
+        sampled = 0
+        nb_lines = 0
+        with open(file, mode="rb") as f:
+            for line in f:
+                if line.strip():
+                    sampled = sampled + len(line)
+                    nb_lines = nb_lines + 1
+                if nb_lines >= SAMPLE_LINES:
+                    break
+        size = size + file_size
+        if nb_lines > 0:
+            documents = documents + round(file_size / (sampled / nb_lines))
+    return (size, documents)
+
+
+# Recommends the settings of an index for the given data volume and number of data nodes.
+# Returns the settings and, per setting, the reason of the recommendation.
+def recommend_settings(size: int, documents: int, data_nodes: int) -> tuple[dict, dict]:
+    settings = {}
+    reasons = {}
+    shards = max(1, math.ceil(size / SHARD_TARGET_SIZE), math.ceil(documents / SHARD_MAX_DOCUMENTS))
+    reasons["number_of_shards"] = "about {}GB or {}M documents per shard".format(SHARD_TARGET_SIZE // 1024 ** 3, SHARD_MAX_DOCUMENTS // 1_000_000)
+    if shards > 1 and data_nodes > 1:
+        # Spread the shards evenly on the data nodes
+        shards = math.ceil(shards / data_nodes) * data_nodes
+        reasons["number_of_shards"] = reasons["number_of_shards"] + ", multiple of the {} data nodes".format(data_nodes)
+    settings["number_of_shards"] = shards
+    settings["number_of_replicas"] = 1 if data_nodes > 1 else 0
+    reasons["number_of_replicas"] = "{} data node(s)".format(data_nodes)
+    if size >= BULK_REFRESH_SIZE:
+        settings["refresh_interval"] = "30s"
+        reasons["refresh_interval"] = "more than {}GB to index".format(BULK_REFRESH_SIZE // 1024 ** 3)
+    else:
+        settings["refresh_interval"] = "1s"
+        reasons["refresh_interval"] = "small volume, default refresh"
+    if size >= COMPRESSION_SIZE:
+        settings["codec"] = "best_compression"
+        reasons["codec"] = "more than {}GB of data".format(COMPRESSION_SIZE // 1024 ** 3)
+    return (settings, reasons)
@@ -0,0 +1,108 @@
+import codecs
+import json
+from typing import Iterable, Iterator
+
+DECODER = json.JSONDecoder()
+WHITESPACES = " \t\n\r"
+
+
+# Incremental parsing of the array found at the given path of a JSON document received in chunks (e.g. ["hits", "hits"]
+# for an elasticsearch search response). The elements of the array are returned as soon as they are received: only one
+# element at a time is kept in memory. The rest of the document, after the array, is not read.
+def iter_json_array(chunks: Iterable[bytes], path: list[str]) -> Iterator[any]:
+    reader = __Reader__(chunks)
+    if not reader.find_array(path):
+        return
+    reader.skip_whitespaces()
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.value()
+        reader.skip_whitespaces()
+        c = reader.next()
+        if c == "]":
+            return
+        if c != ",":
+            raise ValueError("Unexpected character '{}' in the array".format(c))
+
+
+class __Reader__:
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        # Consumed characters are dropped once they represent half of the buffer
+        if self.pos > len(self.buffer) / 2:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        for chunk in self.chunks:
+            text = self.utf8.decode(chunk) if type(chunk) is bytes else chunk
+            if text:
+                self.buffer = self.buffer + text
+                return True
+        self.buffer = self.buffer + self.utf8.decode(b"", final=True)
+        self.eof = True
+        return False
+
+    def peek(self) -> str:
+        while self.pos >= len(self.buffer):
+            if not self.fill():
+                raise ValueError("Unexpected end of the JSON document")
+        return self.buffer[self.pos]
+
+    def next(self) -> str:
+        c = self.peek()
+        self.pos = self.pos + 1
+        return c
+
+    def expect(self, expected: str):
+        self.skip_whitespaces()
+        c = self.next()
+        if c != expected:
+            raise ValueError("Expected '{}' but found '{}'".format(expected, c))
+
+    def skip_whitespaces(self):
+        while self.peek() in WHITESPACES:
+            self.pos = self.pos + 1
+
+    # Decodes the next JSON value. A value ending with the buffer may be truncated (e.g. a number): more data is read first.
+    def value(self) -> any:
+        self.skip_whitespaces()
+        while True:
+            try:
+                (o, end) = DECODER.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return o
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise e
+            self.fill()
+
+    # Moves to the first element of the array found at the path. Returns False if the path is not in the document.
+    def find_array(self, path: list[str]) -> bool:
+        for key in path:
+            self.expect("{")
+            while True:
+                self.skip_whitespaces()
+                if self.peek() == "}":
+                    return False
+                k = self.value()
+                self.expect(":")
+                if k == key:
+                    break
+                self.value()
+                self.skip_whitespaces()
+                if self.next() == "}":
+                    return False
+        self.skip_whitespaces()
+        if self.peek() != "[":
+            return False
+        self.pos = self.pos + 1
+        return True
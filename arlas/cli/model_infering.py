@@ -1,8 +1,11 @@
-import json
+import numpy as np
 from shapely import wkt
 import dateutil.parser as date_parser
+import arlas.cli.codec as codec
 
 MAX_KEYWORD_LENGTH = 100
+MAX_SCALED_FLOAT_DECIMALS = 6
+INTEGER_TYPES = [("byte", -2**7, 2**7 - 1), ("short", -2**15, 2**15 - 1), ("integer", -2**31, 2**31 - 1)]
 
 def is_float(string):
     try:
@@ -24,8 +27,12 @@ def __build_tree__(tree: dict, o: any):
             if type(o) is list:
                 o: list = o
                 for c in o:
-                    if type(c) is dict or type(c) is list:
-                        ...  # We can not manage arrays of objects :-(
+                    if type(c) is dict:
+                        # An array of objects: the objects are consolidated in the same node, flagged as an array
+                        tree["__nested__"] = True
+                        __build_tree__(tree, c)
+                    elif type(c) is list:
+                        ...  # We can not manage arrays of arrays :-(
                     else:
                         # An array of values should become a simple type field. 
                         # For instance, list[int] becomes int since ES manages int as int or list[int]
@@ -38,8 +45,40 @@ def __build_tree__(tree: dict, o: any):
         ...
 
 
+# Number of decimals needed to write the float, None if it can not be written with MAX_SCALED_FLOAT_DECIMALS decimals
+def __decimals__(x: float):
+    for decimals in range(0, MAX_SCALED_FLOAT_DECIMALS + 1):
+        if round(x, decimals) == x:
+            return decimals
+    return None
+
+
+# Pick the narrowest integer type containing all the observed values
+def __integer_type__(n: list[int]) -> str:
+    for (t, lower, upper) in INTEGER_TYPES:
+        if min(n) >= lower and max(n) <= upper:
+            return t
+    return "long"
+
+
+# Pick the narrowest float type that stores all the observed values without loss
+def __float_type__(n: list[float]) -> str:
+    # Values out of range overflow to inf, which differs from the value: the overflow warning is not relevant
+    with np.errstate(over="ignore"):
+        if all(float(np.float16(x)) == x for x in n):
+            return "half_float"
+        if all(float(np.float32(x)) == x for x in n):
+            return "float"
+    decimals = [__decimals__(x) for x in n]
+    if all(d is not None for d in decimals):
+        scaling_factor = 10 ** max(decimals)
+        if max(abs(x) for x in n) * scaling_factor < 2**53:
+            return "scaled_float-{}".format(scaling_factor)
+    return "double"
+
+
 # Takes the tree of values and guess the types recursively by relying on __type_node__
-def __type_tree__(path, tree, types):
+def __type_tree__(path, tree, types, narrow_numbers: bool = False):
     if type(tree) is dict:
         for (k, v) in tree.items():
             if path:
@@ -49,27 +88,27 @@ def __type_tree__(path, tree, types):
             if subpath in types:
                 tree[k]["__type__"] = types.get(subpath)
             else:
-                if k == "__type__":
+                if k in ["__type__", "__nested__"]:
                     ...
                 else:
                     if type(v) is dict:
                         if v.get("__items__"):
                             # it is a leaf, we need to get the type
-                            tree[k]["__type__"] = __type_node__(v.get("__items__"), k)
+                            tree[k]["__type__"] = __type_node__(v.get("__items__"), k, narrow_numbers)
                         else:
                             # it is either an intermediate node or a complex type such as geojson
-                            t = __type_node__(v, k)
+                            t = __type_node__(v, k, narrow_numbers)
                             tree[k]["__type__"] = t
                             if t == "object":
                                 # it is an intermediate node, we dive in the node
-                                __type_tree__(subpath, v, types)
+                                __type_tree__(subpath, v, types, narrow_numbers)
                     else:
                         raise Exception("Unexpected state")
     else:
         raise Exception("Unexpected state")
 
 # Type a node. Here is the "guessing"
-def __type_node__(n, name: str = None) -> str:
+def __type_node__(n, name: str = None, narrow_numbers: bool = False) -> str:
     if n is None:
         return "UNDEFINED"
     if type(n) is str:
@@ -111,11 +150,11 @@ def __type_node__(n, name: str = None) -> str:
                 if all((x > 631152000000 and x < 4102444800000) for x in n):
                     return "date-epoch_millis"
                 else:
-                    return "long"
+                    return __integer_type__(n) if narrow_numbers else "long"
             else:
-                return "long"
+                return __integer_type__(n) if narrow_numbers else "long"
         if all(isinstance(x, (float)) for x in n):
-            return "double"
+            return __float_type__(n) if narrow_numbers else "double"
         if all(isinstance(x, (str)) for x in n):
             t = __type_node__(n[0], name)
             if t == "text":
@@ -141,19 +180,44 @@ def __type_node__(n, name: str = None) -> str:
     return "UNDEFINED"
 
 # from the typed tree, generate the mapping.
-def __generate_mapping__(tree, mapping, no_fulltext: list[str], no_index: list[str]):
+# Arrays of objects are mapped as nested if nested_objects is True, as objects otherwise. Beyond max_nested_depth, arrays
+# of objects are kept in the source but not indexed. Beyond max_fields, fields are left out of the mapping.
+def __generate_mapping__(tree, mapping, no_fulltext: list[str], no_index: list[str], no_norms: list[str] = [],
+                         no_doc_values: list[str] = [], field_profile: dict[str, dict[str, bool]] = {}, path: str = None,
+                         nested_objects: bool = False, max_nested_depth: int = None, max_fields: int = None,
+                         depth: int = 0, nb_fields: list[int] = None):
+    if nb_fields is None:
+        nb_fields = [0]
     if type(tree) is dict:
         for (field_name, v) in tree.items():
-            if field_name not in ["__type__", "__values__"]:
+            if field_name not in ["__type__", "__values__", "__nested__"]:
+                field_path = ".".join([path, field_name]) if path else field_name
                 field_type: str = v.get("__type__")
+                nb_fields[0] = nb_fields[0] + 1
+                if max_fields is not None and nb_fields[0] > max_fields:
+                    print(f"-->{field_name}: skipped, more than {max_fields} fields")
+                    continue
                 if field_type == "object":
-                    mapping[field_name] = {"properties": {}}
+                    field_depth = depth + 1 if v.get("__nested__") else depth
+                    if max_nested_depth is not None and field_depth > max_nested_depth:
+                        mapping[field_name] = {"type": "object", "enabled": False}
+                        print(f"-->{field_name}: not indexed, more than {max_nested_depth} levels of arrays of objects")
+                        continue
+                    if v.get("__nested__") and nested_objects:
+                        mapping[field_name] = {"type": "nested", "properties": {}}
+                    else:
+                        mapping[field_name] = {"properties": {}}
                     __generate_mapping__(tree=v, mapping=mapping[field_name]["properties"], no_fulltext=no_fulltext,
-                                         no_index=no_index)
+                                         no_index=no_index, no_norms=no_norms, no_doc_values=no_doc_values,
+                                         field_profile=field_profile, path=field_path, nested_objects=nested_objects,
+                                         max_nested_depth=max_nested_depth, max_fields=max_fields,
+                                         depth=field_depth, nb_fields=nb_fields)
                 else:
                     if field_type.startswith("date-"):
                         # Dates can have format patterns containing '-'
                         mapping[field_name] = {"type": "date", "format": field_type.split("-", 1)[1]}
+                    elif field_type.startswith("scaled_float-"):
+                        mapping[field_name] = {"type": "scaled_float", "scaling_factor": int(field_type.split("-", 1)[1])}
                     else:
                         mapping[field_name] = {"type": field_type}
                         if field_type in ["keyword", "text"]:
@@ -162,15 +226,33 @@ def __generate_mapping__(tree, mapping, no_fulltext: list[str], no_index: list[s
                     # Avoid indexing field if field in --no-index
                     if field_name in no_index:
                         mapping[field_name]["index"] = "false"
+                    # Scoring is useless on keyword-like text: norms can be dropped
+                    if field_name in no_norms and mapping[field_name]["type"] == "text":
+                        mapping[field_name]["norms"] = False
+                    # Fields never aggregated nor sorted do not need doc values (not available for text)
+                    if field_name in no_doc_values and mapping[field_name]["type"] != "text":
+                        mapping[field_name]["doc_values"] = False
+                    __apply_field_profile__(mapping[field_name], field_profile.get(field_path, {}))
                     print(f"-->{field_name}: {mapping[field_name]['type']}")
     else:
         raise Exception("Unexpected state")
 
 
+# Apply the index/doc_values/norms options of a field profile (e.g. {"index": false, "doc_values": false}) on a field mapping
+def __apply_field_profile__(field: dict, profile: dict[str, bool]):
+    if "index" in profile:
+        field["index"] = "true" if profile["index"] else "false"
+    if "norms" in profile and field["type"] == "text":
+        field["norms"] = bool(profile["norms"])
+    if "doc_values" in profile and field["type"] != "text":
+        field["doc_values"] = bool(profile["doc_values"])
+
+
 def make_mapping(file: str, nb_lines: int = 2, types: dict[str, str] = {}, no_fulltext: list[str] = [],
-                 no_index: list[str] = []):
-    tree = {}
-    mapping = {}
+                 no_index: list[str] = [], narrow_numbers: bool = False, no_norms: list[str] = [],
+                 no_doc_values: list[str] = [], field_profile: dict[str, dict[str, bool]] = {},
+                 nested_objects: bool = False, max_nested_depth: int = None, max_fields: int = None):
+    hits = []
     with open(file, mode="r", encoding="utf-8") as f:
         i = 0
         for line in f:
@@ -178,10 +260,26 @@ def make_mapping(file: str, nb_lines: int = 2, types: dict[str, str] = {}, no_fu
                 break
             else:
                 i = i + 1
-                hit = json.loads(line)
-                __build_tree__(tree, hit)
-        __type_tree__("", tree, types)
-        __generate_mapping__(tree, mapping, no_fulltext, no_index)
+                hits.append(codec.loads(line))
+    return make_mapping_from_hits(hits, types=types, no_fulltext=no_fulltext, no_index=no_index,
+                                  narrow_numbers=narrow_numbers, no_norms=no_norms, no_doc_values=no_doc_values,
+                                  field_profile=field_profile, nested_objects=nested_objects,
+                                  max_nested_depth=max_nested_depth, max_fields=max_fields)
+
+
+def make_mapping_from_hits(hits: list[dict], types: dict[str, str] = {}, no_fulltext: list[str] = [],
+                           no_index: list[str] = [], narrow_numbers: bool = False, no_norms: list[str] = [],
+                           no_doc_values: list[str] = [], field_profile: dict[str, dict[str, bool]] = {},
+                           nested_objects: bool = False, max_nested_depth: int = None, max_fields: int = None):
+    tree = {}
+    mapping = {}
+    nb_fields = [0]
+    for hit in hits:
+        __build_tree__(tree, hit)
+    __type_tree__("", tree, types, narrow_numbers)
+    __generate_mapping__(tree, mapping, no_fulltext, no_index, no_norms, no_doc_values, field_profile,
+                         nested_objects=nested_objects, max_nested_depth=max_nested_depth, max_fields=max_fields,
+                         nb_fields=nb_fields)
     mapping["internal"] = {
         "properties": {
             "autocomplete": {
@@ -193,8 +291,12 @@ def make_mapping(file: str, nb_lines: int = 2, types: dict[str, str] = {}, no_fu
             }
         }
     }
+    mappings = {
+        "properties": mapping
+    }
+    if max_fields is not None and nb_fields[0] > max_fields:
+        # Some fields have been left out: they must not be added by the dynamic mapping
+        mappings["dynamic"] = False
     return {
-        "mappings": {
-            "properties": mapping
-        }
+        "mappings": mappings
     }
@@ -73,10 +73,7 @@ def delete_user(org_id: str = typer.Argument(help="Organisation's identifier"),
 def groups(org_id: str = typer.Argument(help="Organisation's identifier")):
     config = variables["arlas"]
     tab = PrettyTable(["id", "name", "description", "is technical", "type"], sortby="name", align="l")
-    groups = Service.list_organisation_groups(config, org_id)
-    tab.add_rows(groups)
-    roles = Service.list_organisation_roles(config, org_id)
-    tab.add_rows(roles)
+    tab.add_rows(Service.list_organisation_groups_and_roles(config, org_id))
     print(tab)
 
 
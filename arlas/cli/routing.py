@@ -0,0 +1,101 @@
+import hashlib
+import sys
+from typing import Callable
+from shapely import wkt
+from shapely.geometry import shape
+import arlas.cli.codec as codec
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat: float, lon: float, precision: int) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    nb_bits = 0
+    even = True
+    while len(chars) < precision:
+        # Even bits refine the longitude, odd bits the latitude
+        (value, interval) = (lon, lon_range) if even else (lat, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        bits = bits << 1
+        if value >= middle:
+            bits = bits | 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        nb_bits = nb_bits + 1
+        if nb_bits == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            nb_bits = 0
+    return "".join(chars)
+
+
+# Returns the function computing the routing of a document: the value of a field, or the geohash of the centroid of a
+# geometry field ("geohash:<precision>"). Documents without value are routed by a hash of their content: they are
+# spread on the shards, and still have the routing required by an index with a routing partition size.
+def make_routing(routing: str, geometry: str = None) -> Callable[[dict], str]:
+    route = __make_route__(routing, geometry)
+    return lambda hit: route(hit) or __content_routing__(hit)
+
+
+def __make_route__(routing: str, geometry: str = None) -> Callable[[dict], str | None]:
+    if routing.startswith("geohash:"):
+        try:
+            precision = int(routing.split(":", 1)[1])
+        except ValueError:
+            precision = 0
+        if precision < 1 or precision > 12:
+            print("Error: invalid routing \"{}\". The geohash precision must be between 1 and 12 (e.g. geohash:3)".format(routing), file=sys.stderr)
+            exit(1)
+        if not geometry:
+            print("Error: a routing by geohash requires the path of the geometry field (--routing-geometry)", file=sys.stderr)
+            exit(1)
+        return lambda hit: __geohash_routing__(__get_path__(hit, geometry), precision)
+    return lambda hit: __field_routing__(__get_path__(hit, routing))
+
+
+def __content_routing__(hit: dict) -> str:
+    return hashlib.md5(codec.dumpb(hit)).hexdigest()[:16]
+
+
+def __field_routing__(value: any) -> str | None:
+    if value is None or type(value) in [dict, list]:
+        return None
+    return str(value)
+
+
+# The geometry can be a GeoJSON geometry, a WKT, or a point ("lat,lon", geohash, [lon, lat] or {"lat":, "lon":})
+def __geohash_routing__(geometry: any, precision: int) -> str | None:
+    try:
+        if geometry is None:
+            return None
+        if type(geometry) is dict and "lat" in geometry and "lon" in geometry:
+            return geohash(float(geometry["lat"]), float(geometry["lon"]), precision)
+        if type(geometry) is dict:
+            centroid = shape(geometry).centroid
+            return geohash(centroid.y, centroid.x, precision)
+        if type(geometry) is list and len(geometry) >= 2:
+            return geohash(float(geometry[1]), float(geometry[0]), precision)
+        if type(geometry) is str:
+            if "(" in geometry:
+                centroid = wkt.loads(geometry).centroid
+                return geohash(centroid.y, centroid.x, precision)
+            if "," in geometry:
+                (lat, lon) = geometry.split(",", 1)
+                return geohash(float(lat), float(lon), precision)
+            return geometry[:precision]
+    except Exception:
+        ...
+    return None
+
+
+def __get_path__(o: dict, path: str) -> any:
+    for key in path.split("."):
+        if type(o) is not dict:
+            return None
+        o = o.get(key)
+    return o
@@ -1,18 +1,57 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+import fnmatch
+import hashlib
 import json
+import http.cookiejar
 import os
+import re
+from queue import Empty, Full, Queue
+import shutil
 import sys
+import threading
+import time
+from typing import Callable, Iterable, Iterator, TextIO
 import urllib.parse
 from alive_progress import alive_bar
+import jwt
 import requests
-from arlas.cli.settings import ARLAS, Configuration, Resource, AuthorizationService
+import urllib3
+import arlas.cli.codec as codec
+from arlas.cli.cache import ResponseCache
+from arlas.cli.json_stream import iter_json_array
+from arlas.cli.settings import ARLAS, Configuration, HTTPPolicy, Resource, AuthorizationService
+from arlas.cli.trace import Trace
+from arlas.cli.variables import variables
 from datetime import datetime
 
 requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
 
+# Size of the chunks read from the streamed responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Methods that can be sent again without side effects, and maximum wait accepted from a Retry-After header
+IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]
+MAX_RETRY_AFTER = 60
+
+# Tokens expiring within that number of seconds are renewed
+TOKEN_EXPIRY_MARGIN = 30
+
+# Number of times the documents rejected by an overloaded cluster are sent again
+BULK_RETRIES = 3
+
+# Seconds between two polls of a running elasticsearch task
+TASK_POLL_INTERVAL = 2
+
+# Connection pools kept per configuration and service: number of hosts and number of connections per host
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+
 
 class RequestException(Exception):
     def __init__(self, code, message):
+        super().__init__(message)
         self.code = code
         self.message = message
 
@@ -25,6 +64,11 @@ class Services(Enum):
 
 class Service:
     curl: bool = False
+    sessions: dict[tuple[str, str], requests.Session] = {}
+    sessions_lock = threading.Lock()
+    tokens: dict[str, str] = {}
+    tokens_lock = threading.Lock()
+    circuits: dict[tuple[str, str], tuple[int, float | None]] = {}
 
     @staticmethod
     def test_arlas_server(arlas: str):
@@ -61,7 +105,7 @@ class Service:
 
     @staticmethod
     def create_user(arlas: str, email: str):
-        return Service.__arlas__(arlas, "users", post=json.dumps({"email": email}), service=Services.iam)
+        return Service.__arlas__(arlas, "users", post=codec.dumpb({"email": email}), service=Services.iam)
 
     @staticmethod
     def describe_user(arlas: str, id: str):
@@ -80,7 +124,7 @@ class Service:
             data["firstName"] = firstName
         if lastName:
             data["lastName"] = lastName
-        return Service.__arlas__(arlas, "/".join(["users", id]), put=json.dumps(data), service=Services.iam)
+        return Service.__arlas__(arlas, "/".join(["users", id]), put=codec.dumpb(data), service=Services.iam)
 
     @staticmethod
     def delete_user(arlas: str, id: str):
@@ -157,9 +201,17 @@ class Service:
                                       ],
                         groups))
 
+    @staticmethod
+    def list_organisation_groups_and_roles(arlas: str, oid: str):
+        (groups, roles) = AsyncService.run(AsyncService.gather(
+            AsyncService.__arlas__(arlas, "/".join(["organisations", oid, "groups"]), service=Services.iam),
+            AsyncService.__arlas__(arlas, "/".join(["organisations", oid, "roles"]), service=Services.iam)))
+        return list(map(lambda group: [group.get("id"), group.get("fullName"), group.get("description"), group.get("isTechnical"), "group"], groups)) + \
+            list(map(lambda role: [role.get("id"), role.get("name"), role.get("description"), role.get("isTechnical"), "role"], roles))
+
     @staticmethod
     def add_user_in_organisation(arlas: str, oid: str, email: str, groups: list[str]):
-        return Service.__arlas__(arlas, "/".join(["organisations", oid, "users"]), post=json.dumps({"email": email, "rids": groups}), service=Services.iam)
+        return Service.__arlas__(arlas, "/".join(["organisations", oid, "users"]), post=codec.dumpb({"email": email, "rids": groups}), service=Services.iam)
 
     @staticmethod
     def delete_user_in_organisation(arlas: str, oid: str, user_id: str):
@@ -167,7 +219,7 @@ class Service:
 
     @staticmethod
     def add_group_in_organisation(arlas: str, oid: str, group_name: str, group_description: str):
-        return Service.__arlas__(arlas, "/".join(["organisations", oid, "groups"]), post=json.dumps({"name": group_name, "description": group_description}), service=Services.iam)
+        return Service.__arlas__(arlas, "/".join(["organisations", oid, "groups"]), post=codec.dumpb({"name": group_name, "description": group_description}), service=Services.iam)
 
     @staticmethod
     def delete_group_in_organisation(arlas: str, oid: str, group_id: str):
@@ -175,7 +227,7 @@ class Service:
 
     @staticmethod
     def add_permission_in_organisation(arlas: str, oid: str, permission_value: str, permission_description: str):
-        return Service.__arlas__(arlas, "/".join(["organisations", oid, "permissions"]), post=json.dumps({"value": permission_value, "description": permission_description}), service=Services.iam)
+        return Service.__arlas__(arlas, "/".join(["organisations", oid, "permissions"]), post=codec.dumpb({"value": permission_value, "description": permission_description}), service=Services.iam)
 
     @staticmethod
     def delete_permission_in_organisation(arlas: str, oid: str, permission_id: str):
@@ -199,7 +251,7 @@ class Service:
 
     @staticmethod
     def add_role_in_organisation(arlas: str, oid: str, role_name: str, role_description: str):
-        return Service.__arlas__(arlas, "/".join(["organisations", oid, "roles"]), post=json.dumps({"name": role_name, "description": role_description}), service=Services.iam)
+        return Service.__arlas__(arlas, "/".join(["organisations", oid, "roles"]), post=codec.dumpb({"name": role_name, "description": role_description}), service=Services.iam)
 
     @staticmethod
     def delete_role_in_organisation(arlas: str, oid: str, role_id: str):
@@ -228,7 +280,7 @@ class Service:
 
     @staticmethod
     def list_collections(arlas: str) -> list[list[str]]:
-        data = Service.__arlas__(arlas, "explore/_list")
+        data = Service.__arlas__(arlas, "explore/_list", cache=True)
         table = [["name", "index"]]
         for collection in data:
             table.append([
@@ -237,33 +289,39 @@ class Service:
             ])
         return table
 
+    # The indices matching the pattern, with their document count and their size in bytes. Filtering and sorting are done
+    # by elasticsearch, on the needed columns only.
     @staticmethod
-    def list_indices(arlas: str, keep_only: str = None) -> list[list[str]]:
-        data = json.loads(Service.__es__(arlas, "_cat/indices?format=json"))
+    def list_indices(arlas: str, pattern: str = None, sort: str = "name", top: int = None) -> list[list[str]]:
+        sort_columns = {"name": "index", "count": "docs.count:desc", "size": "store.size:desc"}
+        if sort not in sort_columns:
+            print("Error: unknown sort {}, one of {} expected".format(sort, ", ".join(sort_columns.keys())), file=sys.stderr)
+            exit(1)
+        path = "/".join(["_cat", "indices", urllib.parse.quote(pattern, safe=",*")]) if pattern else "_cat/indices"
+        data = codec.loads(Service.__es__(arlas, path + "?format=json&h=index,status,docs.count,store.size&bytes=b&s=" + sort_columns[sort]))
         table = [["name", "status", "count", "size"]]
-        for index in data:
-            if keep_only is None or keep_only == index.get("index"):
-                table.append([
-                    index.get("index"),
-                    index.get("status"),
-                    index.get("docs.count"),
-                    index.get("store.size")
-                ])
+        for index in data[:top] if top else data:
+            table.append([
+                index.get("index"),
+                index.get("status"),
+                int(index.get("docs.count")) if index.get("docs.count") else 0,
+                int(index.get("store.size")) if index.get("store.size") else 0
+            ])
         return table
 
     @staticmethod
     def set_collection_visibility(arlas: str, collection: str, public: bool):
-        description = Service.__arlas__(arlas, "/".join(["explore", collection, "_describe"]))
+        description = Service.get_collection_description(arlas, collection, cache=False)
         doc = {
             "shared": description.get("params", {}).get("organisations", {}).get("shared", []),
             "public": public
         }
-        return Service.__arlas__(arlas, "/".join(["collections", collection, "organisations"]), patch=json.dumps(doc)).get("params", {}).get("organisations", {}).get("public")
+        return Service.__arlas__(arlas, "/".join(["collections", collection, "organisations"]), patch=codec.dumpb(doc)).get("params", {}).get("organisations", {}).get("public")
 
     @staticmethod
     def set_collection_display_name(arlas: str, collection: str, name: str):
         doc = name
-        return Service.__arlas__(arlas, "/".join(["collections", collection, "display_names", "collection"]), patch=json.dumps(doc)).get("params", {}).get("display_names", {}).get("collection")
+        return Service.__arlas__(arlas, "/".join(["collections", collection, "display_names", "collection"]), patch=codec.dumpb(doc)).get("params", {}).get("display_names", {}).get("collection")
 
     @staticmethod
     def set_collection_field_display_name(arlas: str, collection: str, field_name: str, field_display_name: str):
@@ -276,13 +334,13 @@ class Service:
                 # Remove the alias
                 aliasses.pop(field_display_name)
         table = [["field path", "display name"]]
-        for path, name in Service.__arlas__(arlas, "/".join(["collections", collection, "display_names", "fields"]), patch=json.dumps(aliasses)).get("params", {}).get("display_names", {}).get("fields", {}).items():
+        for path, name in Service.__arlas__(arlas, "/".join(["collections", collection, "display_names", "fields"]), patch=codec.dumpb(aliasses)).get("params", {}).get("display_names", {}).get("fields", {}).items():
             table.append([path, name])
         return table
 
     @staticmethod
     def share_with(arlas: str, collection: str, organisation: str):
-        description = Service.__arlas__(arlas, "/".join(["explore", collection, "_describe"]))
+        description = Service.get_collection_description(arlas, collection, cache=False)
         orgs = description.get("params", {}).get("organisations", {}).get("shared", [])
         if organisation not in orgs:
             orgs.append(organisation)
@@ -292,11 +350,11 @@ class Service:
                 "public": description.get("params", {}).get("organisations", {}).get("public", False)
             }
         }
-        return Service.__arlas__(arlas, "/".join(["collections", collection, "organisations"]), patch=json.dumps(doc)).get("params", {}).get("organisations", {}).get("shared")
+        return Service.__arlas__(arlas, "/".join(["collections", collection, "organisations"]), patch=codec.dumpb(doc)).get("params", {}).get("organisations", {}).get("shared")
 
     @staticmethod
     def unshare_with(arlas: str, collection: str, organisation: str):
-        description = Service.__arlas__(arlas, "/".join(["explore", collection, "_describe"]))
+        description = Service.get_collection_description(arlas, collection, cache=False)
         orgs: list = description.get("params", {}).get("organisations", {}).get("shared", [])
         if organisation in orgs:
             orgs.remove(organisation)
@@ -308,18 +366,35 @@ class Service:
                 "public": description.get("params", {}).get("organisations", {}).get("public", False)
             }
         }
-        return Service.__arlas__(arlas, "/".join(["collections", collection, "organisations"]), patch=json.dumps(doc)).get("params", {}).get("organisations", {}).get("shared")
+        return Service.__arlas__(arlas, "/".join(["collections", collection, "organisations"]), patch=codec.dumpb(doc)).get("params", {}).get("organisations", {}).get("shared")
+
+    @staticmethod
+    def get_collection_description(arlas: str, collection: str, cache: bool = True) -> dict:
+        return Service.__arlas__(arlas, "/".join(["explore", collection, "_describe"]), cache=cache)
+
+    @staticmethod
+    def get_collection_descriptions(arlas: str, pattern: str = "*") -> list[dict]:
+        # The list of the collections comes with their descriptions, only the incomplete ones are fetched again
+        descriptions = list(filter(lambda d: fnmatch.fnmatchcase(d.get("collection_name", ""), pattern),
+                                   Service.__arlas__(arlas, "explore/_list", cache=True)))
+        incomplete = list(filter(lambda d: "properties" not in d, descriptions))
+        fetched = AsyncService.run(AsyncService.gather(
+            *[AsyncService.__arlas__(arlas, "/".join(["explore", d.get("collection_name"), "_describe"]), cache=True) for d in incomplete]))
+        for (d, description) in zip(incomplete, fetched):
+            d.update({**description, "collection_name": d.get("collection_name")})
+        return descriptions
 
     @staticmethod
-    def describe_collection(arlas: str, collection: str) -> list[list[str]]:
-        description = Service.__arlas__(arlas, "/".join(["explore", collection, "_describe"]))
+    def describe_collection(arlas: str, collection: str, description: dict = None) -> list[list[str]]:
+        if description is None:
+            description = Service.get_collection_description(arlas, collection)
         table = [["field name", "type"]]
         table.extend(Service.__get_fields__([], description.get("properties", {})))
         return table
 
     @staticmethod
-    def metadata_collection(arlas: str, collection: str) -> list[list[str]]:
-        d = Service.__arlas__(arlas, "/".join(["explore", collection, "_describe"]))
+    def metadata_collection(arlas: str, collection: str, description: dict = None) -> list[list[str]]:
+        d = description if description is not None else Service.get_collection_description(arlas, collection)
         table = [["metadata", "value"]]
         table.append(["index name", d.get("params", {}).get("index_name", {})])
         table.append(["id path", d.get("params", {}).get("id_path", "")])
@@ -334,42 +409,199 @@ class Service:
     
     @staticmethod
     def describe_index(arlas: str, index: str) -> list[list[str]]:
-        description = json.loads(Service.__es__(arlas, "/".join([index, "_mapping"])))
         table = [["field name", "type"]]
-        table.extend(Service.__get_fields__([], description.get(index, {}).get("mappings", {}).get("properties", {})))
+        table.extend(Service.__get_fields__([], Service.get_index_properties(arlas, index)))
         return table
+
+    @staticmethod
+    def get_index_properties(arlas: str, index: str) -> dict:
+        description = codec.loads(Service.__es__(arlas, "/".join([index, "_mapping"]), cache=True))
+        return description.get(index, {}).get("mappings", {}).get("properties", {})
     
     @staticmethod
-    def clone_index(arlas: str, index: str, name: str) -> list[list[str]]:
+    def clone_index(arlas: str, index: str, name: str, split: int = None, wait_for_status: str = "yellow", timeout: int = 600) -> list[list[str]]:
         Service.__es__(arlas, "/".join([index, "_block", "write"]), put="")
-        Service.__es__(arlas, "/".join([index, "_clone", name]), put="")
-        Service.__es__(arlas, "/".join([index, "_settings"]), put='{"index.blocks.write": false}')
-        return Service.list_indices(arlas, keep_only=name)
-    
+        try:
+            # The target must not inherit the write block of the source
+            settings = {"index.blocks.write": None}
+            if split:
+                settings["index.number_of_shards"] = split
+            Service.__es__(arlas, "/".join([index, "_split" if split else "_clone", name]) + "?wait_for_active_shards=0", put=codec.dumpb({"settings": settings}))
+            Service.__poll_progress__(lambda: Service.__health_progress__(arlas, name, wait_for_status), interval=0, timeout=timeout,
+                                      timeout_message="{} is not {} after {}s, its shards are still being allocated".format(name, wait_for_status, timeout))
+        finally:
+            Service.__es__(arlas, "/".join([index, "_settings"]), put='{"index.blocks.write": false}')
+        return Service.list_indices(arlas, pattern=name)
+
+    # Fraction of the shards of the index that are active, or None once the index has the expected health status
+    @staticmethod
+    def __health_progress__(arlas: str, index: str, status: str) -> float | None:
+        try:
+            health = codec.loads(Service.__es__(arlas, "/".join(["_cluster", "health", index]) + "?wait_for_status={}&timeout={}s".format(status, TASK_POLL_INTERVAL), exit_on_failure=False))
+        except RequestException as e:
+            # The health is returned with 408 when the status is not reached yet
+            if e.code != 408:
+                print("Error: health of {} can not be read ({}): {}".format(index, e.code, e.message), file=sys.stderr)
+                exit(1)
+            health = codec.loads(e.message)
+        if not health.get("timed_out"):
+            return None
+        active = health.get("active_shards", 0)
+        total = active + sum(map(lambda k: health.get(k, 0), ["initializing_shards", "relocating_shards", "unassigned_shards"]))
+        return active / total if total else 0.0
+
     @staticmethod
-    def migrate_index(arlas: str, index: str, target_arlas: str, target_name: str) -> list[list[str]]:
+    def migrate_index(arlas: str, index: str, target_arlas: str, target_name: str, requests_per_second: float = None) -> list[list[str]]:
         source = Configuration.settings.arlas.get(arlas)
+        target = Configuration.settings.arlas.get(target_arlas)
         migration = {
             "source": {
-                "remote": {
-                    "host": source.elastic.location,
-                    "username": source.elastic.login,
-                    "password": source.elastic.password,
-                },
                 "index": index,
                 "query": {"match_all": {}},
             },
             "dest": {"index": target_name},
         }
+        # Slicing is not supported when reindexing from a remote cluster
+        remote = target is None or target.elastic is None or target.elastic.location != source.elastic.location
+        if remote:
+            migration["source"]["remote"] = {
+                "host": source.elastic.location,
+                "username": source.elastic.login,
+                "password": source.elastic.password,
+            }
         print("1/3: fetch mapping ...")
         mapping = Service.__es__(arlas, "/".join([index, "_mapping"]))
-        mapping = json.dumps(json.loads(mapping).get(index))
+        mapping = codec.dumpb(codec.loads(mapping).get(index))
         print("2/3: copy mapping ...")
         Service.__es__(target_arlas, "/".join([target_name]), put=mapping)
         print("3/3: copy data ...")
-        print(Service.__es__(target_arlas, "/".join(["_reindex"]), post=json.dumps(migration)))
-        return Service.list_indices(target_arlas, keep_only=target_name)
-    
+        query = "wait_for_completion=false" + ("" if remote else "&slices=auto")
+        if requests_per_second:
+            query = query + "&requests_per_second={}".format(requests_per_second)
+        task = codec.loads(Service.__es__(target_arlas, "_reindex?" + query, post=codec.dumpb(migration))).get("task")
+        response = Service.__track_task__(target_arlas, task, Service.count_index_hits(arlas, index))
+        print("{} documents created in {}s".format(response.get("created", 0), round(response.get("took", 0) / 1000)))
+        return Service.list_indices(target_arlas, pattern=target_name)
+
+    # Copies the index segments with a snapshot of the source index, restored in the target configuration. Both clusters
+    # must access the repository: a shared file system repository is registered at location if given, read only
+    # for the target. Otherwise the repository must already be registered on both clusters.
+    @staticmethod
+    def migrate_index_via_snapshot(arlas: str, index: str, target_arlas: str, target_name: str, repository: str, location: str = None, keep_snapshot: bool = False) -> list[list[str]]:
+        if location:
+            print("1/4: register repository {} ...".format(repository))
+            Service.__es__(arlas, "/".join(["_snapshot", repository]), put=codec.dumpb({"type": "fs", "settings": {"location": location}}))
+            source = Configuration.settings.arlas.get(arlas)
+            target = Configuration.settings.arlas.get(target_arlas)
+            # On the same cluster, the repository is already registered and must stay writable for the snapshot
+            if target is None or target.elastic is None or target.elastic.location != source.elastic.location:
+                Service.__es__(target_arlas, "/".join(["_snapshot", repository]), put=codec.dumpb({"type": "fs", "settings": {"location": location, "readonly": True}}))
+        else:
+            print("1/4: check repository {} ...".format(repository))
+            for configuration in [arlas, target_arlas]:
+                try:
+                    Service.__es__(configuration, "/".join(["_snapshot", repository]), exit_on_failure=False)
+                except RequestException as e:
+                    print("Error: repository {} not found on {} ({}). Use --repository-location to register it.".format(repository, configuration, e.code), file=sys.stderr)
+                    exit(1)
+        snapshot = "{}-migration-{}".format(index, datetime.now().strftime("%Y%m%d%H%M%S")).lower()
+        print("2/4: snapshot {} in {} ...".format(index, snapshot))
+        Service.__es__(arlas, "/".join(["_snapshot", repository, snapshot]) + "?wait_for_completion=false", put=codec.dumpb({"indices": index, "include_global_state": False}))
+        try:
+            Service.__poll_progress__(lambda: Service.__snapshot_progress__(arlas, repository, snapshot))
+        except KeyboardInterrupt:
+            # Deleting a running snapshot aborts it
+            Service.__es__(arlas, "/".join(["_snapshot", repository, snapshot]), delete=True, exit_on_failure=False)
+            print("Snapshot {} aborted".format(snapshot), file=sys.stderr)
+            exit(1)
+        print("3/4: restore {} as {} ...".format(snapshot, target_name))
+        Service.__es__(target_arlas, "/".join(["_snapshot", repository, snapshot, "_restore"]), post=codec.dumpb({
+            "indices": index,
+            "include_global_state": False,
+            "include_aliases": False,
+            "rename_pattern": "^{}$".format(re.escape(index)),
+            "rename_replacement": target_name
+        }))
+        Service.__poll_progress__(lambda: Service.__recovery_progress__(target_arlas, target_name))
+        if keep_snapshot:
+            print("4/4: snapshot {} kept in {}".format(snapshot, repository))
+        else:
+            print("4/4: delete snapshot {} ...".format(snapshot))
+            Service.__es__(arlas, "/".join(["_snapshot", repository, snapshot]), delete=True)
+        return Service.list_indices(target_arlas, pattern=target_name)
+
+    # Displays the progress returned by poll(), a fraction between 0 and 1 or None once completed
+    @staticmethod
+    def __poll_progress__(poll: Callable[[], float | None], interval: int = TASK_POLL_INTERVAL, timeout: int = None, timeout_message: str = None):
+        start = time.time()
+        with alive_bar(manual=True) as bar:
+            while True:
+                progress = poll()
+                if progress is None:
+                    bar(1.0)
+                    return
+                bar(progress)
+                if timeout and time.time() - start > timeout:
+                    print("Error: {}".format(timeout_message if timeout_message else "timeout after {}s".format(timeout)), file=sys.stderr)
+                    exit(1)
+                time.sleep(interval)
+
+    @staticmethod
+    def __snapshot_progress__(arlas: str, repository: str, snapshot: str) -> float | None:
+        status = codec.loads(Service.__es__(arlas, "/".join(["_snapshot", repository, snapshot, "_status"]))).get("snapshots", [{}])[0]
+        if status.get("state") == "SUCCESS":
+            return None
+        if status.get("state") in ["FAILED", "ABORTED", "PARTIAL"]:
+            print("Error: snapshot {} ended with state {}".format(snapshot, status.get("state")), file=sys.stderr)
+            exit(1)
+        stats = status.get("stats", {})
+        total = stats.get("total", {}).get("size_in_bytes", 0)
+        return stats.get("processed", {}).get("size_in_bytes", 0) / total if total else 0.0
+
+    @staticmethod
+    def __recovery_progress__(arlas: str, index: str) -> float | None:
+        shards = codec.loads(Service.__es__(arlas, "/".join([index, "_recovery"]))).get(index, {}).get("shards", [])
+        primaries = list(filter(lambda shard: shard.get("primary"), shards))
+        if len(primaries) > 0 and all(map(lambda shard: shard.get("stage") == "DONE", primaries)):
+            return None
+        total = sum(map(lambda shard: shard.get("index", {}).get("size", {}).get("total_in_bytes", 0), primaries))
+        recovered = sum(map(lambda shard: shard.get("index", {}).get("size", {}).get("recovered_in_bytes", 0), primaries))
+        return recovered / total if total else 0.0
+
+    # Polls the elasticsearch task until it completes, with a progress bar of the documents processed. The task is
+    # cancelled on Ctrl-C. Returns the response of the task.
+    @staticmethod
+    def __track_task__(arlas: str, task: str, total: int = None) -> dict:
+        done = 0
+        try:
+            with alive_bar(total) as bar:
+                while True:
+                    result = codec.loads(Service.__es__(arlas, "/".join(["_tasks", task])))
+                    status = result.get("task", {}).get("status", {})
+                    progress = sum(map(lambda k: status.get(k, 0), ["created", "updated", "deleted", "noops", "version_conflicts"]))
+                    if progress > done:
+                        bar(progress - done)
+                        done = progress
+                    if result.get("completed"):
+                        break
+                    time.sleep(TASK_POLL_INTERVAL)
+        except KeyboardInterrupt:
+            print("Cancelling task {} ...".format(task), file=sys.stderr)
+            try:
+                Service.__es__(arlas, "/".join(["_tasks", task, "_cancel"]), post="", exit_on_failure=False)
+                print("Task {} cancelled".format(task), file=sys.stderr)
+            except RequestException as e:
+                print("Error: task {} could not be cancelled ({}): {}".format(task, e.code, e.message), file=sys.stderr)
+            exit(1)
+        if result.get("error"):
+            print("Error: task {} failed: {}".format(task, codec.dumps(result.get("error"))), file=sys.stderr)
+            exit(1)
+        response = result.get("response", {})
+        failures = response.get("failures", [])
+        if len(failures) > 0:
+            print("Warning: {} document(s) failed, first failure: {}".format(len(failures), codec.dumps(failures[0])), file=sys.stderr)
+        return response
+
     @staticmethod
     def sample_collection(arlas: str, collection: str, pretty: bool, size: int) -> dict:
         sample = Service.__arlas__(arlas, "/".join(["explore", collection, "_search"]) + "?size={}".format(size))
@@ -377,13 +609,306 @@ class Service:
 
     @staticmethod
     def sample_index(arlas: str, collection: str, pretty: bool, size: int) -> dict:
-        sample = json.loads(Service.__es__(arlas, "/".join([collection, "_search"]) + "?size={}".format(size)))
+        sample = codec.loads(Service.__es__(arlas, "/".join([collection, "_search"]) + "?size={}".format(size)))
         return sample
     
+    @staticmethod
+    def stream_sample_collection(arlas: str, collection: str, size: int) -> Iterator[dict]:
+        r: requests.Response = Service.__arlas__(arlas, "/".join(["explore", collection, "_search"]) + "?size={}".format(size), stream=True)
+        with r:
+            yield from iter_json_array(r.iter_content(chunk_size=STREAM_CHUNK_SIZE), ["hits"])
+
+    @staticmethod
+    def stream_sample_index(arlas: str, index: str, size: int) -> Iterator[dict]:
+        r: requests.Response = Service.__es__(arlas, "/".join([index, "_search"]) + "?size={}&filter_path=hits.hits".format(size), stream=True)
+        with r:
+            yield from iter_json_array(r.iter_content(chunk_size=STREAM_CHUNK_SIZE), ["hits", "hits"])
+
+    # Writes all the hits of the collection, page after page sorted on the id path. With partitions, the timestamp
+    # range of the collection is split in as many ranges, exported in parallel.
+    @staticmethod
+    def export_collection(arlas: str, collection: str, write: Callable[[dict], None], filters: list[str] = [], partitions: int = 1, page_size: int = 1000):
+        params = Service.get_collection_description(arlas, collection).get("params", {})
+        id_path = params.get("id_path")
+        if not id_path:
+            print("Error: collection {} has no id path, its hits can not be paginated.".format(collection), file=sys.stderr)
+            exit(1)
+        ranges = [[]]
+        if partitions > 1:
+            timestamp_path = params.get("timestamp_path")
+            if not timestamp_path:
+                print("Error: collection {} has no timestamp path, it can not be partitioned.".format(collection), file=sys.stderr)
+                exit(1)
+            ranges = Service.__time_ranges__(arlas, collection, timestamp_path, filters, partitions)
+        with ThreadPoolExecutor(max_workers=min(len(ranges), AsyncService.max_concurrency)) as executor:
+            futures = [executor.submit(Service.__export_pages__, arlas, collection, id_path, filters + r, page_size, write) for r in ranges]
+            for future in futures:
+                future.result()
+
+    @staticmethod
+    def count_collection_hits(arlas: str, collection: str, filters: list[str] = []) -> int:
+        query = urllib.parse.urlencode([("f", f) for f in filters])
+        return Service.__arlas__(arlas, "/".join(["explore", collection, "_count"]) + "?" + query).get("totalnb", 0)
+
+    @staticmethod
+    def __export_pages__(arlas: str, collection: str, id_path: str, filters: list[str], page_size: int, write: Callable[[dict], None]):
+        after = None
+        while True:
+            query = [("size", page_size), ("sort", id_path)] + [("f", f) for f in filters] + ([("after", after)] if after else [])
+            r: requests.Response = Service.__arlas__(arlas, "/".join(["explore", collection, "_search"]) + "?" + urllib.parse.urlencode(query), stream=True)
+            nb_hits = 0
+            last = None
+            with r:
+                for hit in iter_json_array(r.iter_content(chunk_size=STREAM_CHUNK_SIZE), ["hits"]):
+                    write(hit)
+                    nb_hits = nb_hits + 1
+                    last = hit
+            if nb_hits < page_size:
+                return
+            after = last.get("md", {}).get("id")
+            if after is None:
+                print("Error: the hits of collection {} have no id, they can not be paginated.".format(collection), file=sys.stderr)
+                exit(1)
+
+    # Splits the timestamp range of the collection in consecutive and disjoint ranges of milliseconds, as ARLAS range filters
+    @staticmethod
+    def __time_ranges__(arlas: str, collection: str, timestamp_path: str, filters: list[str], partitions: int) -> list[list[str]]:
+        bounds = []
+        for metric in ["min", "max"]:
+            query = urllib.parse.urlencode([("field", timestamp_path), ("metric", metric)] + [("f", f) for f in filters])
+            bounds.append(Service.__arlas__(arlas, "/".join(["explore", collection, "_compute"]) + "?" + query).get("value"))
+        if bounds[0] is None or bounds[1] is None:
+            return [[]]
+        lower = int(bounds[0])
+        upper = int(bounds[1])
+        step = max(1, -(-(upper - lower + 1) // partitions))
+        ranges = []
+        for start in range(lower, upper + 1, step):
+            ranges.append(["{}:range:[{}<{}]".format(timestamp_path, start, min(start + step - 1, upper))])
+        return ranges
+
+    # Reads the index with a point in time, in as many slices as requested, read in parallel. The hits of a slice
+    # are passed to write(slice, hit). The point in time is closed at the end, even on failure.
+    @staticmethod
+    def export_index(arlas: str, index: str, write: Callable[[int, dict], None], slices: int = 1, page_size: int = 1000, keep_alive: str = "5m"):
+        pit = Service.__open_pit__(arlas, index, keep_alive)
+        try:
+            with ThreadPoolExecutor(max_workers=min(slices, AsyncService.max_concurrency)) as executor:
+                futures = [executor.submit(Service.__export_slice__, arlas, pit, i, slices, page_size, keep_alive, write) for i in range(slices)]
+                for future in futures:
+                    future.result()
+        finally:
+            Service.__close_pit__(arlas, pit)
+
+    @staticmethod
+    def count_index_hits(arlas: str, index: str) -> int:
+        return codec.loads(Service.__es__(arlas, "/".join([index, "_count"]))).get("count", 0)
+
+    @staticmethod
+    def __export_slice__(arlas: str, pit: str, slice: int, slices: int, page_size: int, keep_alive: str, write: Callable[[int, dict], None]):
+        for (_, hits, _) in Service.__read_slice__(arlas, pit, slice, slices, page_size, keep_alive):
+            for hit in hits:
+                write(slice, hit)
+
+    # Pages of a slice of a point in time, from the search_after position if any: (point in time id, hits, search_after of the last hit)
+    @staticmethod
+    def __read_slice__(arlas: str, pit: str, slice: int, slices: int, page_size: int, keep_alive: str, search_after: list = None, exit_on_failure: bool = True) -> Iterator[tuple[str, list[dict], list]]:
+        while True:
+            query = {
+                "size": page_size,
+                "pit": {"id": pit, "keep_alive": keep_alive},
+                "sort": [{"_shard_doc": "asc"}],
+                "track_total_hits": False
+            }
+            if slices > 1:
+                query["slice"] = {"id": slice, "max": slices}
+            if search_after:
+                query["search_after"] = search_after
+            page = codec.loads(Service.__es__(arlas, "_search?filter_path=pit_id,hits.hits._id,hits.hits._source,hits.hits.sort", post=codec.dumpb(query), exit_on_failure=exit_on_failure))
+            # The point in time id may change from one page to the next
+            pit = page.get("pit_id", pit)
+            hits = page.get("hits", {}).get("hits", [])
+            for hit in hits:
+                search_after = hit.pop("sort", None)
+            if len(hits) > 0:
+                yield (pit, hits, search_after)
+            if len(hits) < page_size:
+                return
+
+    @staticmethod
+    def __open_pit__(arlas: str, index: str, keep_alive: str) -> str:
+        return codec.loads(Service.__es__(arlas, "/".join([index, "_pit"]) + "?keep_alive=" + keep_alive, post="")).get("id")
+
+    @staticmethod
+    def __close_pit__(arlas: str, pit: str):
+        try:
+            Service.__es__(arlas, "_pit", delete=codec.dumpb({"id": pit}), exit_on_failure=False)
+        except RequestException as e:
+            # An expired point in time is already closed
+            if e.code != 404:
+                print("Warning: point in time could not be closed ({}): {}".format(e.code, e.message), file=sys.stderr)
+
+    # Copies the index by reading it (sliced point in time) and writing it (bulk, with the same ids) from the command line.
+    # Each slice has a reader and a writer running concurrently. The position of a slice is saved in a checkpoint file
+    # after each bulk: an interrupted migration resumes from the checkpoints. A slice whose point in time expired is
+    # copied again from its start, which is harmless since the documents keep their ids.
+    @staticmethod
+    def migrate_index_client_side(arlas: str, index: str, target_arlas: str, target_name: str, slices: int = 4, page_size: int = 1000,
+                                  keep_alive: str = "5m", checkpoints: str = None) -> list[list[str]]:
+        checkpoints = checkpoints if checkpoints else target_name + ".checkpoints"
+        # The copy is described before the target is created: a copy interrupted at any time can be resumed
+        copy = {"index": index, "slices": slices}
+        previous = Service.__read_checkpoint__(os.path.join(checkpoints, "copy.json"))
+        if previous is None:
+            os.makedirs(checkpoints, exist_ok=True)
+            Service.__write_checkpoint__(os.path.join(checkpoints, "copy.json"), copy)
+        elif previous != copy:
+            print("Error: the checkpoints of {} are for copying {} in {} slices, not {} in {} slices. Run the same copy again to resume it, or remove {}.".format(
+                checkpoints, previous.get("index"), previous.get("slices"), index, slices, checkpoints), file=sys.stderr)
+            exit(1)
+        resume = previous is not None and Service.index_exists(target_arlas, target_name)
+        states = [Service.__read_checkpoint__(os.path.join(checkpoints, "{}.json".format(i))) if resume else None for i in range(slices)]
+        source_settings = codec.loads(Service.__es__(arlas, "/".join([index, "_settings"]))).get(index, {}).get("settings", {}).get("index", {})
+        # Settings for bulk loading, restored at the end
+        load_settings = {"number_of_replicas": 0, "refresh_interval": "-1"}
+        if resume:
+            print("1/3: resume from {} ...".format(checkpoints))
+            Service.__es__(target_arlas, "/".join([target_name, "_settings"]), put=codec.dumpb({"index": load_settings}))
+        else:
+            print("1/3: create target index ...")
+            mapping = codec.loads(Service.__es__(arlas, "/".join([index, "_mapping"]))).get(index, {})
+            settings = {**load_settings, "number_of_shards": source_settings.get("number_of_shards", 1)}
+            Service.__es__(target_arlas, target_name, put=codec.dumpb({"mappings": mapping.get("mappings", {}), "settings": {"index": settings}}))
+        print("2/3: copy data ...")
+        pit = Service.__open_pit__(arlas, index, keep_alive)
+        failed = threading.Event()
+        lock = threading.Lock()
+        try:
+            with alive_bar(Service.count_index_hits(arlas, index)) as bar:
+                def on_copied(nb: int):
+                    with lock:
+                        bar(nb)
+                with ThreadPoolExecutor(max_workers=2 * slices) as executor:
+                    futures = []
+                    for i in range(slices):
+                        state = states[i] if states[i] else {"pit": pit, "search_after": None, "done": False}
+                        if state.get("done"):
+                            continue
+                        pages = Queue(maxsize=2)
+                        futures.append(executor.submit(Service.__migrate_reader__, arlas, index, state, i, slices, page_size, keep_alive, pit, pages, failed))
+                        futures.append(executor.submit(Service.__migrate_writer__, target_arlas, target_name, state, os.path.join(checkpoints, "{}.json".format(i)), pages, failed, on_copied))
+                    try:
+                        for future in futures:
+                            future.result()
+                    except BaseException as e:
+                        # Stops the other readers and writers, the checkpoints are kept for resuming
+                        failed.set()
+                        if isinstance(e, KeyboardInterrupt):
+                            print("Interrupted: run the same command again to resume the copy from {}".format(checkpoints), file=sys.stderr)
+                            exit(1)
+                        raise e
+        finally:
+            Service.__close_pit__(arlas, pit)
+        print("3/3: restore settings ...")
+        Service.__es__(target_arlas, "/".join([target_name, "_settings"]), put=codec.dumpb({"index": {
+            "number_of_replicas": source_settings.get("number_of_replicas", 1),
+            "refresh_interval": source_settings.get("refresh_interval", None)
+        }}))
+        Service.__es__(target_arlas, "/".join([target_name, "_refresh"]), post="")
+        shutil.rmtree(checkpoints, ignore_errors=True)
+        return Service.list_indices(target_arlas, pattern=target_name)
+
+    @staticmethod
+    def __migrate_reader__(arlas: str, index: str, state: dict, slice: int, slices: int, page_size: int, keep_alive: str, pit: str, pages: Queue, failed: threading.Event):
+        try:
+            try:
+                for page in Service.__read_slice__(arlas, state.get("pit"), slice, slices, page_size, keep_alive, state.get("search_after"), exit_on_failure=False):
+                    Service.__put_page__(pages, page, failed)
+            except RequestException as e:
+                if e.code != 404 or state.get("pit") == pit:
+                    print("Error: reading slice {} of {} failed ({}): {}".format(slice, index, e.code, e.message), file=sys.stderr)
+                    exit(1)
+                print("Warning: the point in time of slice {} expired, the slice is copied again".format(slice), file=sys.stderr)
+                for page in Service.__read_slice__(arlas, pit, slice, slices, page_size, keep_alive):
+                    Service.__put_page__(pages, page, failed)
+            # End of the slice
+            Service.__put_page__(pages, None, failed)
+        except BaseException as e:
+            failed.set()
+            raise e
+
+    @staticmethod
+    def __put_page__(pages: Queue, page: tuple | None, failed: threading.Event):
+        while not failed.is_set():
+            try:
+                pages.put(page, timeout=1)
+                return
+            except Full:
+                ...
+        exit(1)
+
+    @staticmethod
+    def __migrate_writer__(arlas: str, index: str, state: dict, checkpoint: str, pages: Queue, failed: threading.Event, on_copied: Callable[[int], None]):
+        try:
+            while True:
+                if failed.is_set():
+                    exit(1)
+                try:
+                    page = pages.get(timeout=1)
+                except Empty:
+                    continue
+                if page is None:
+                    state["done"] = True
+                    Service.__write_checkpoint__(checkpoint, state)
+                    return
+                (pit, hits, search_after) = page
+                Service.__bulk_hits__(arlas, index, hits)
+                state["pit"] = pit
+                state["search_after"] = search_after
+                Service.__write_checkpoint__(checkpoint, state)
+                on_copied(len(hits))
+        except BaseException as e:
+            failed.set()
+            raise e
+
+    # Indexes the hits with their ids. The documents rejected because elasticsearch is overloaded (429) are sent again.
+    @staticmethod
+    def __bulk_hits__(arlas: str, index: str, hits: list[dict]):
+        for attempt in range(BULK_RETRIES + 1):
+            data = b"".join(map(lambda hit: codec.dumpb({"index": {"_index": index, "_id": hit.get("_id")}}) + b"\n" + codec.dumpb(hit.get("_source", {})) + b"\n", hits))
+            result = codec.loads(Service.__es__(arlas, "_bulk", post=data, headers={"Content-Type": "application/x-ndjson"}))
+            if not result.get("errors"):
+                return
+            items = list(map(lambda item: item.get("index", {}), result.get("items", [])))
+            errors = list(filter(lambda item: item.get("error") and item.get("status") != 429, items))
+            if len(errors) > 0:
+                print("Warning: {} document(s) rejected, first error: {}".format(len(errors), codec.dumps(errors[0].get("error"))), file=sys.stderr)
+            hits = [hit for (hit, item) in zip(hits, items) if item.get("status") == 429]
+            if len(hits) == 0:
+                return
+            time.sleep(2 ** attempt)
+        print("Error: {} document(s) rejected by the overloaded cluster".format(len(hits)), file=sys.stderr)
+        exit(1)
+
+    @staticmethod
+    def __read_checkpoint__(path: str) -> dict | None:
+        try:
+            with open(path, mode="r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def __write_checkpoint__(path: str, state: dict):
+        # The checkpoint is replaced atomically: an interruption never leaves a truncated file
+        with open(path + ".tmp", mode="w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
     @staticmethod
     def create_collection(arlas: str, collection: str, model_resource: str, index: str, display_name: str, owner: str, orgs: list[str], is_public: bool, id_path: str, centroid_path: str, geometry_path: str, date_path: str):
         if model_resource:
-            model = json.loads(Service.__fetch__(model_resource))
+            model = codec.loads(Service.__fetch__(model_resource))
         else:
             model = {}
         if index:
@@ -410,20 +935,96 @@ class Service:
             display_names = model.get("display_names", {})
             display_names["collection"] = display_name
             model["display_names"] = display_names
-        Service.__arlas__(arlas, "/".join(["collections", collection]), put=json.dumps(model))
+        Service.__arlas__(arlas, "/".join(["collections", collection]), put=codec.dumpb(model))
 
     @staticmethod
-    def create_index_from_resource(arlas: str, index: str, mapping_resource: str, number_of_shards: int):
-        mapping = json.loads(Service.__fetch__(mapping_resource))
+    def create_index_from_resource(arlas: str, index: str, mapping_resource: str, number_of_shards: int, settings: dict = None):
+        mapping = codec.loads(Service.__fetch__(mapping_resource))
         if not mapping.get("mappings"):
             print("Error: mapping {} does not contain \"mappings\" at its root.".format(mapping_resource), file=sys.stderr)
             exit(1)
-        Service.create_index(arlas, index, mapping, number_of_shards)
+        Service.create_index(arlas, index, mapping, number_of_shards, settings=settings)
+
+    # The settings, if given, override the number of shards
+    @staticmethod
+    def create_index(arlas: str, index: str, mapping: str, number_of_shards: int = 1, settings: dict = None):
+        index_doc = {"mappings": mapping.get("mappings"), "settings": {"number_of_shards": number_of_shards, **(settings or {})}}
+        if index_doc["settings"].get("routing_partition_size"):
+            # A partitioned routing requires a routing for every document
+            index_doc["mappings"] = {**index_doc["mappings"], "_routing": {"required": True}}
+        Service.__es__(arlas, "/".join([index]), put=codec.dumpb(index_doc))
+
+    @staticmethod
+    def count_data_nodes(arlas: str) -> int:
+        nodes = codec.loads(Service.__es__(arlas, "_cat/nodes?format=json&h=node.role"))
+        # d: data, s: data_content, h: data_hot
+        return len(list(filter(lambda node: any(role in node.get("node.role", "") for role in "dsh"), nodes)))
+
+    @staticmethod
+    def get_alias_indices(arlas: str, alias: str) -> list[str]:
+        try:
+            return list(codec.loads(Service.__es__(arlas, "/".join(["_alias", alias]), exit_on_failure=False)).keys())
+        except RequestException as e:
+            if e.code == 404:
+                return []
+            print("Error: alias {} can not be read ({}): {}".format(alias, e.code, e.message), file=sys.stderr)
+            exit(1)
+
+    @staticmethod
+    def index_exists(arlas: str, index: str) -> bool:
+        try:
+            Service.__es__(arlas, "/".join([index, "_settings"]), exit_on_failure=False)
+            return True
+        except RequestException as e:
+            if e.code == 404:
+                return False
+            print("Error: index {} can not be read ({}): {}".format(index, e.code, e.message), file=sys.stderr)
+            exit(1)
 
+    # Creates a new index for the alias, named after the alias and the current time, with the mapping and settings of the
+    # index currently behind the alias (or the given mapping for the first load) and settings for bulk loading.
+    # If the alias is still an index, it is converted: the index is replaced by the alias when switching.
+    # Returns the new index, the indices behind the alias and the settings to restore once loaded.
     @staticmethod
-    def create_index(arlas: str, index: str, mapping: str, number_of_shards: int = 1):
-        index_doc = {"mappings": mapping.get("mappings"), "settings": {"number_of_shards": number_of_shards}}
-        Service.__es__(arlas, "/".join([index]), put=json.dumps(index_doc))
+    def create_reload_index(arlas: str, alias: str, mapping_resource: Resource = None, convert: bool = False) -> tuple[str, list[str], dict]:
+        old_indices = Service.get_alias_indices(arlas, alias)
+        if len(old_indices) == 0 and Service.index_exists(arlas, alias):
+            if not convert:
+                print("Error: {} is an index, not an alias. Use --convert to replace the index by an alias on the reloaded data.".format(alias), file=sys.stderr)
+                exit(1)
+            old_indices = [alias]
+        index_settings = {}
+        if len(old_indices) > 0:
+            current = sorted(old_indices)[-1]
+            mapping = codec.loads(Service.__es__(arlas, "/".join([current, "_mapping"]))).get(current, {}).get("mappings", {})
+            index_settings = codec.loads(Service.__es__(arlas, "/".join([current, "_settings"]))).get(current, {}).get("settings", {}).get("index", {})
+        elif mapping_resource:
+            mapping = codec.loads(Service.__fetch__(mapping_resource)).get("mappings", {})
+        else:
+            print("Error: alias {} not found, a mapping is required for the first load.".format(alias), file=sys.stderr)
+            exit(1)
+        settings = {k: v for (k, v) in index_settings.items() if k in ["number_of_shards", "analysis", "codec", "mapping", "max_result_window"]}
+        settings.update({"number_of_replicas": 0, "refresh_interval": "-1"})
+        index = "{}-{}".format(alias, datetime.now().strftime("%Y%m%d%H%M%S")).lower()
+        Service.__es__(arlas, index, put=codec.dumpb({"mappings": mapping, "settings": {"index": settings}}))
+        restore = {"number_of_replicas": index_settings.get("number_of_replicas", 1), "refresh_interval": index_settings.get("refresh_interval", None)}
+        return (index, old_indices, restore)
+
+    # Restores the settings of the loaded index, then moves the alias from the old indices to it in a single atomic call.
+    # An old index named as the alias is deleted in that call, for the alias to take its name.
+    @staticmethod
+    def switch_alias(arlas: str, alias: str, index: str, old_indices: list[str], restore: dict, delete_old: bool = False):
+        Service.__es__(arlas, "/".join([index, "_settings"]), put=codec.dumpb({"index": restore}))
+        Service.__es__(arlas, "/".join([index, "_refresh"]), post="")
+        Service.__es__(arlas, "/".join(["_cluster", "health", index]) + "?wait_for_status=yellow&timeout=60s")
+        actions = []
+        for old_index in old_indices:
+            if delete_old or old_index == alias:
+                actions.append({"remove_index": {"index": old_index}})
+            else:
+                actions.append({"remove": {"index": old_index, "alias": alias}})
+        actions.append({"add": {"index": index, "alias": alias}})
+        Service.__es__(arlas, "_aliases", post=codec.dumpb({"actions": actions}))
 
     @staticmethod
     def delete_collection(arlas: str, collection: str):
@@ -433,19 +1034,73 @@ class Service:
     def delete_index(arlas: str, index: str):
         Service.__es__(arlas, "/".join([index]), delete=True)
 
+    # Updates in place the documents matching the query, with a painless script if given. Runs as a sliced task.
+    @staticmethod
+    def update_by_query(arlas: str, index: str, query: dict, script: str = None, requests_per_second: float = None) -> dict:
+        body = {"query": query}
+        if script:
+            body["script"] = {"source": script, "lang": "painless"}
+        return Service.__by_query__(arlas, index, "_update_by_query", body, requests_per_second)
+
+    @staticmethod
+    def delete_by_query(arlas: str, index: str, query: dict, requests_per_second: float = None) -> dict:
+        return Service.__by_query__(arlas, index, "_delete_by_query", {"query": query}, requests_per_second)
+
+    @staticmethod
+    def __by_query__(arlas: str, index: str, action: str, body: dict, requests_per_second: float = None) -> dict:
+        total = codec.loads(Service.__es__(arlas, "/".join([index, "_count"]), post=codec.dumpb({"query": body.get("query")}))).get("count", 0)
+        query = "wait_for_completion=false&slices=auto"
+        if requests_per_second:
+            query = query + "&requests_per_second={}".format(requests_per_second)
+        task = codec.loads(Service.__es__(arlas, "/".join([index, action]) + "?" + query, post=codec.dumpb(body))).get("task")
+        return Service.__track_task__(arlas, task, total)
+
     @staticmethod
-    def count_collection(arlas: str, collection: str) -> list[list[str]]:
-        collections = []
+    def count_collection(arlas: str, collection: str, by_index: bool = False, on_count: Callable[[list[str]], None] = None) -> list[list[str]]:
         if collection:
-            collections.append(collection)
+            collections = [{"collection_name": collection}]
         else:
-            for line in Service.list_collections(arlas)[1:]:
-                collections.append(line[0])
-        table = [["collection name", "count"]]
-        for collection in collections:
-            count = Service.__arlas__(arlas, "/".join(["explore", collection, "_count"]))
-            table.append([collection, count.get("totalnb", "UNKNOWN")])
-        return table
+            collections = Service.__arlas__(arlas, "explore/_list", cache=True)
+        tasks = []
+        if by_index and Configuration.settings.arlas.get(arlas).elastic is not None:
+            # Collections without filter on the same index share one elasticsearch count
+            indices: dict[str, list[str]] = {}
+            for description in collections:
+                params = description.get("params", {})
+                if params.get("index_name") and not params.get("filter"):
+                    indices.setdefault(params.get("index_name"), []).append(description.get("collection_name"))
+                else:
+                    tasks.append(Service.__count_collections__(arlas, [description.get("collection_name")]))
+            for (index, names) in indices.items():
+                tasks.append(Service.__count_index__(arlas, index, names))
+        else:
+            for description in collections:
+                tasks.append(Service.__count_collections__(arlas, [description.get("collection_name")]))
+
+        async def __count__() -> list[list[str]]:
+            rows = []
+            # Rows are reported as soon as their count is received
+            for task in asyncio.as_completed(tasks):
+                for row in await task:
+                    rows.append(row)
+                    if on_count:
+                        on_count(row)
+            return rows
+        return [["collection name", "count"]] + AsyncService.run(__count__())
+
+    @staticmethod
+    async def __count_collections__(arlas: str, collections: list[str]) -> list[list[str]]:
+        counts = await AsyncService.gather(*[AsyncService.__arlas__(arlas, "/".join(["explore", collection, "_count"])) for collection in collections])
+        return [[collection, count.get("totalnb", "UNKNOWN")] for (collection, count) in zip(collections, counts)]
+
+    @staticmethod
+    async def __count_index__(arlas: str, index: str, collections: list[str]) -> list[list[str]]:
+        try:
+            count = codec.loads(await AsyncService.__es__(arlas, "/".join([urllib.parse.quote(index, safe=",*"), "_count"]), exit_on_failure=False)).get("count", "UNKNOWN")
+            return [[collection, count] for collection in collections]
+        except RequestException as e:
+            print("Warning: count of index {} failed ({}), the collections are counted with ARLAS".format(index, e.code), file=sys.stderr)
+            return await Service.__count_collections__(arlas, collections)
 
     @staticmethod
     def count_hits(file_path: str) -> int:
@@ -508,7 +1163,7 @@ class Service:
 
     @staticmethod
     def create_api_key(arlas: str, oid: str, name: str, ttlInDays: int, uid: str, gids: list[str]):
-        return Service.__arlas__(arlas, "/".join(["organisations", oid, "users", uid, "apikeys"]), post=json.dumps({"name": name, "ttlInDays": ttlInDays, "roleIds": gids}), service=Services.iam)
+        return Service.__arlas__(arlas, "/".join(["organisations", oid, "users", uid, "apikeys"]), post=codec.dumpb({"name": name, "ttlInDays": ttlInDays, "roleIds": gids}), service=Services.iam)
 
     @staticmethod
     def delete_api_key(arlas: str, oid: str, uid: str, keyid: str):
@@ -524,7 +1179,7 @@ class Service:
 
     @staticmethod
     def forbid_organisation(arlas: str, name: str):
-        return Service.__arlas__(arlas, "/".join(["organisations", "forbidden"]), post=json.dumps({"name": name}), service=Services.iam)
+        return Service.__arlas__(arlas, "/".join(["organisations", "forbidden"]), post=codec.dumpb({"name": name}), service=Services.iam)
 
     @staticmethod
     def authorize_organisation(arlas: str, name: str):
@@ -532,40 +1187,94 @@ class Service:
 
     @staticmethod
     def __index_bulk__(arlas: str, index: str, bulk: []):
-        data = os.linesep.join([json.dumps(line) for line in bulk]) + os.linesep
-        result = json.loads(Service.__es__(arlas, "/".join([index, "_bulk"]), post=data, exit_on_failure=False, headers={"Content-Type": "application/x-ndjson"}))
+        data = b"\n".join(map(codec.dumpb, bulk)) + b"\n"
+        policy: HTTPPolicy = Service.__policy__(arlas)
+        # Enough retries to open the circuit breaker: the last ones wait for the service to be back
+        retries = BULK_RETRIES + (policy.circuit_breaker_threshold or 0)
+        for attempt in range(retries + 1):
+            try:
+                result = codec.loads(Service.__es__(arlas, "/".join([index, "_bulk"]), post=data, exit_on_failure=False, headers={"Content-Type": "application/x-ndjson"}))
+                break
+            except RequestException as e:
+                # The documents have no id: the bulk is sent again only if it has not been processed, i.e. if it was
+                # rejected or if the connection could not be opened (a connection lost after sending may have been processed)
+                not_processed = e.code in [429, 503] or Service.__not_connected__(e.__cause__)
+                if not not_processed or attempt == retries:
+                    raise e
+                delay = min(policy.backoff_factor * (2 ** attempt), MAX_RETRY_AFTER)
+                print("Warning: bulk failed ({}), retry {}/{} in {}s".format(e.code or e.message, attempt + 1, retries, delay), file=sys.stderr)
+                time.sleep(delay)
         if result["errors"] is True:
-            print("ERROR: " + json.dumps(result))
+            print("ERROR: " + codec.dumps(result))
+
+    @staticmethod
+    def __not_connected__(e: BaseException) -> bool:
+        if isinstance(e, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(e, requests.exceptions.ConnectionError) and len(e.args) > 0:
+            return isinstance(getattr(e.args[0], "reason", None), urllib3.exceptions.NewConnectionError)
+        return False
 
     @staticmethod
     def index_hits(arlas: str, index: str, file_path: str, bulk_size: int = 5000, count: int = -1) -> dict[str, int]:
+        with open(file_path, mode="r", encoding="utf-8") as f:
+            Service.index_lines(arlas, index=index, lines=f, bulk_size=bulk_size, count=count)
+
+    @staticmethod
+    def index_lines(arlas: str, index: str, lines: Iterable[str], bulk_size: int = 5000, count: int = -1,
+                    validator: Callable[[dict], str | None] = None, rejects: TextIO = None,
+                    routing: Callable[[dict], str | None] = None) -> int:
         line_number = 0
         line_in_bulk = 0
+        nb_rejected = 0
         bulk = []
-        with open(file_path, mode="r", encoding="utf-8") as f:
-            with alive_bar(count) as bar:
-                for line in f:
-                    line_number = line_number + 1
-                    line_in_bulk = line_in_bulk + 1
-                    bulk.append({
-                        "index": {
-                            "_index": index
-                        }
-                    })
-                    bulk.append(json.loads(line))
-                    if line_in_bulk == bulk_size:
-                        try:
-                            Service.__index_bulk__(arlas, index, bulk)
-                        except RequestException as e:
-                            print("Error on bulk insert between line {} and {} with code {}: {}".format(line_number, line_number - bulk_size, e.code, e.message))
-                        bulk = []
-                        line_in_bulk = 0
-                    bar()
+        with alive_bar(count) as bar:
+            for line in lines:
+                line_number = line_number + 1
+                if validator:
+                    # Invalid documents are written in the rejects instead of being sent to elasticsearch
+                    try:
+                        hit = codec.loads(line)
+                        error = validator(hit)
+                    except json.JSONDecodeError as e:
+                        error = "invalid JSON ({})".format(e.msg)
+                    if error:
+                        nb_rejected = nb_rejected + 1
+                        if nb_rejected <= 10:
+                            print("Warning: line {} rejected: {}".format(line_number, error), file=sys.stderr)
+                        if rejects:
+                            rejects.write(line if line.endswith("\n") else line + "\n")
+                        bar()
+                        continue
+                else:
+                    hit = codec.loads(line)
+                line_in_bulk = line_in_bulk + 1
+                action = {
+                    "index": {
+                        "_index": index
+                    }
+                }
+                route = routing(hit) if routing else None
+                if route is not None:
+                    action["index"]["routing"] = route
+                bulk.append(action)
+                bulk.append(hit)
+                if line_in_bulk == bulk_size:
+                    try:
+                        Service.__index_bulk__(arlas, index, bulk)
+                    except RequestException as e:
+                        print("Error on bulk insert between line {} and {} with code {}: {}".format(line_number - bulk_size + 1, line_number, e.code, e.message), file=sys.stderr)
+                        exit(1)
+                    bulk = []
+                    line_in_bulk = 0
+                bar()
         if len(bulk) > 0:
             try:
                 Service.__index_bulk__(arlas, index, bulk)
             except RequestException as e:
-                print("Error on bulk insert between line {} and {} with code {}: {}".format(line_number, line_number - bulk_size, e.code, e.message))
+                print("Error on bulk insert between line {} and {} with code {}: {}".format(line_number - len(bulk) // 2 + 1, line_number, e.code, e.message), file=sys.stderr)
+                exit(1)
+        return nb_rejected
 
     @staticmethod
     def __get_fields__(origin: list[str], properties: dict[str:dict]):
@@ -583,7 +1292,7 @@ class Service:
         return fields
     
     @staticmethod
-    def __arlas__(arlas: str, suffix, post=None, put=None, patch=None, delete=None, service=Services.arlas_server, exit_on_failure: bool = False):
+    def __arlas__(arlas: str, suffix, post=None, put=None, patch=None, delete=None, service=Services.arlas_server, exit_on_failure: bool = False, cache: bool = False, stream: bool = False):
         configuration: ARLAS = Configuration.settings.arlas.get(arlas, None)
         if configuration is None:
             print("Error: arlas configuration {} not found among [{}] for {}.".format(arlas, ", ".join(Configuration.settings.arlas.keys()), service.name), file=sys.stderr)
@@ -616,9 +1325,15 @@ class Service:
                 method = "PUT"
             if delete:
                 method = "DELETE"
-            r: requests.Response = Service.__request__(url, method, data, __headers__)
+            r: requests.Response = Service.__request__(url, method, data, __headers__, arlas=arlas, service=service.value, cache=cache, stream=stream)
+            if r.status_code == 401 and configuration.authorization is not None:
+                # The cached token may have been revoked: a new one is requested
+                Service.__forget_token__(arlas, __headers__["Authorization"][len("Bearer "):])
+                __headers__["Authorization"] = "Bearer " + Service.__get_token__(arlas)
+                r = Service.__request__(url, method, data, __headers__, arlas=arlas, service=service.value, cache=cache, stream=stream)
             if r.status_code >= 200 and r.status_code < 300:
-                return r.json()
+                # A streamed response is returned as is, for the caller to read it incrementally
+                return r if stream else codec.loads(r.content)
             else:
                 print("Error: request {} failed with status {}: {}".format(method, str(r.status_code), str(r.reason)), file=sys.stderr)
                 print("   url: {}".format(url), file=sys.stderr)
@@ -633,7 +1348,7 @@ class Service:
                 raise e
 
     @staticmethod
-    def __es__(arlas: str, suffix, post=None, put=None, delete=None, exit_on_failure: bool = True, headers: dict[str, str] = {}):
+    def __es__(arlas: str, suffix, post=None, put=None, delete=None, exit_on_failure: bool = True, headers: dict[str, str] = {}, cache: bool = False, stream: bool = False):
         endpoint = Configuration.settings.arlas.get(arlas)
         if endpoint is None:
             print("Error: arlas configuration {} not found among [{}].".format(arlas, ", ".join(Configuration.settings.arlas.keys())), file=sys.stderr)
@@ -642,7 +1357,7 @@ class Service:
             print("Error: arlas configuration {} misses an elasticsearch configuration.".format(arlas), file=sys.stderr)
             exit(1)
         url = "/".join([endpoint.elastic.location, suffix])
-        __headers = endpoint.elastic.headers
+        __headers = endpoint.elastic.headers.copy()
         __headers.update(headers)
         auth = (endpoint.elastic.login, endpoint.elastic.password) if endpoint.elastic.login else None
         method = "GET"
@@ -654,10 +1369,22 @@ class Service:
             data = put
             method = "PUT"
         if delete is not None:
+            # delete is either True or the body of the request
+            data = delete if type(delete) in [str, bytes] else None
             method = "DELETE"
-        r: requests.Response = Service.__request__(url, method, data, __headers, auth)
+        try:
+            r: requests.Response = Service.__request__(url, method, data, __headers, auth, arlas=arlas, service="elastic", cache=cache, stream=stream)
+        except (requests.exceptions.RequestException, RequestException) as e:
+            if exit_on_failure:
+                print("Error: request {} failed on {}".format(method, e), file=sys.stderr)
+                print("   url: {}".format(url), file=sys.stderr)
+                exit(1)
+            if isinstance(e, RequestException):
+                raise e
+            raise RequestException(None, str(e)) from e
         if r.status_code >= 200 and r.status_code < 300:
-            return r.content
+            # A streamed response is returned as is, for the caller to read it incrementally
+            return r if stream else r.content
         elif exit_on_failure:
             print("Error: request {} failed with status {}: {}".format(method, str(r.status_code), str(r.reason)), file=sys.stderr)
             print("   url: {}".format(url), file=sys.stderr)
@@ -669,23 +1396,139 @@ class Service:
             raise RequestException(r.status_code, r.content)
 
     @staticmethod
-    def __request__(url: str, method: str, data: any = None, headers: dict[str, str] = {}, auth: tuple[str, str | None] = None) -> requests.Response:
+    def __request__(url: str, method: str, data: any = None, headers: dict[str, str] = {}, auth: tuple[str, str | None] = None, arlas: str = None, service: str = None, cache: bool = False, stream: bool = False) -> requests.Response:
         if Service.curl:
             print('curl -k -X {} "{}" {}'.format(method.upper(), url, " ".join(list(map(lambda h: '--header "' + h + ":" + headers.get(h) + '"', headers)))), end="")
             if (method.upper() in ["POST", "PUT"]):
-                print(" -d {}".format(data))
-        if method.upper() == "POST":
-            r = requests.post(url, data=data, headers=headers, auth=auth, verify=False)
-        elif method.upper() == "PATCH":
-            r = requests.patch(url, data=data, headers=headers, auth=auth, verify=False)
-        elif method == "PUT":
-            r = requests.put(url, data=data, headers=headers, auth=auth, verify=False)
-        elif method == "DELETE":
-            r = requests.delete(url, headers=headers, auth=auth, verify=False)
-        else:
-            r = requests.get(url, headers=headers, auth=auth, verify=False)
+                print(" -d {}".format(data.decode("utf-8") if type(data) is bytes else data))
+        if method.upper() not in ["POST", "PATCH", "PUT", "DELETE"]:
+            data = None
+        entry = None
+        if cache and method.upper() == "GET":
+            identity = Service.__identity__(arlas, headers, auth)
+            entry = ResponseCache.get(arlas, url, identity)
+            if entry and entry.get("fresh"):
+                Trace.record(method, url, "cached", 0, len(entry.get("content")), time.time(), 0, 0)
+                return Service.__cached_response__(url, entry)
+            if entry and entry.get("etag"):
+                headers = {**headers, "If-None-Match": entry.get("etag")}
+        r = Service.__send__(url, method, data, headers, auth, arlas, service, stream=stream)
+        if entry and r.status_code == 304:
+            # Not modified: the cached content is still valid
+            ResponseCache.put(arlas, url, identity, entry.get("content"), entry.get("etag"))
+            return Service.__cached_response__(url, entry)
+        if r.status_code >= 200 and r.status_code < 300:
+            if cache and method.upper() == "GET":
+                ResponseCache.put(arlas, url, identity, r.content, r.headers.get("ETag"))
+            elif method.upper() != "GET":
+                ResponseCache.invalidate(arlas)
         return r
 
+    @staticmethod
+    def __send__(url: str, method: str, data: any, headers: dict[str, str], auth: tuple[str, str | None], arlas: str, service: str, stream: bool = False) -> requests.Response:
+        policy: HTTPPolicy = Service.__policy__(arlas)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retries = 0
+        start = time.time()
+        while True:
+            Service.__check_circuit__(arlas, service, url, policy)
+            try:
+                r = Service.__session__(arlas, service).request(method.upper(), url, data=data, headers=headers, auth=auth, verify=False, timeout=(policy.connect_timeout, policy.read_timeout), stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                Service.__record_failure__(arlas, service, policy)
+                # A request that could not connect has not been processed and can be sent again, whatever its method
+                if retries < policy.retries and (idempotent or isinstance(e, requests.exceptions.ConnectTimeout)):
+                    retries = retries + 1
+                    Service.__wait_before_retry__(retries, policy, None, "{} on {}".format(type(e).__name__, url))
+                    continue
+                Trace.record(method, url, type(e).__name__, len(data) if data else 0, 0, start, 0, time.time() - start, retries)
+                raise e
+            if r.status_code in [502, 503, 504]:
+                Service.__record_failure__(arlas, service, policy)
+            else:
+                Service.__record_success__(arlas, service)
+            # 429 and 503 are sent before processing the request, 502 and 504 may be sent after
+            if retries < policy.retries and (r.status_code in [429, 503] or (r.status_code in [502, 504] and idempotent)):
+                retries = retries + 1
+                # Releases the connection of a response that is not read
+                r.close()
+                Service.__wait_before_retry__(retries, policy, r.headers.get("Retry-After"), "status {} on {}".format(r.status_code, url))
+                continue
+            # A streamed response is not read yet: its announced length is recorded
+            bytes_in = int(r.headers.get("Content-Length", 0)) if stream else len(r.content)
+            Trace.record(method, url, r.status_code, len(data) if data else 0, bytes_in, start, r.elapsed.total_seconds(), time.time() - start, retries)
+            return r
+
+    @staticmethod
+    def __policy__(arlas: str) -> HTTPPolicy:
+        configuration: ARLAS = Configuration.settings.arlas.get(arlas, None) if arlas else None
+        if configuration and configuration.http:
+            return configuration.http
+        return HTTPPolicy()
+
+    @staticmethod
+    def __wait_before_retry__(retry: int, policy: HTTPPolicy, retry_after: str, reason: str):
+        delay = policy.backoff_factor * (2 ** (retry - 1))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(int(retry_after), MAX_RETRY_AFTER))
+        print("Warning: {}, retry {}/{} in {}s".format(reason, retry, policy.retries, delay), file=sys.stderr)
+        time.sleep(delay)
+
+    @staticmethod
+    def __check_circuit__(arlas: str, service: str, url: str, policy: HTTPPolicy):
+        # When the circuit is open, no request is sent to the failing service until circuit_breaker_reset seconds have passed
+        with Service.sessions_lock:
+            (failures, opened_at) = Service.circuits.get((arlas, service), (0, None))
+            wait = policy.circuit_breaker_reset - (time.time() - opened_at) if opened_at is not None else 0
+        if wait > 0:
+            print("Warning: {} consecutive failures, waiting {}s before sending {}".format(failures, round(wait, 1), url), file=sys.stderr)
+            time.sleep(wait)
+
+    @staticmethod
+    def __record_failure__(arlas: str, service: str, policy: HTTPPolicy):
+        with Service.sessions_lock:
+            (failures, opened_at) = Service.circuits.get((arlas, service), (0, None))
+            failures = failures + 1
+            if policy.circuit_breaker_threshold and failures >= policy.circuit_breaker_threshold:
+                opened_at = time.time()
+            Service.circuits[(arlas, service)] = (failures, opened_at)
+
+    @staticmethod
+    def __record_success__(arlas: str, service: str):
+        with Service.sessions_lock:
+            Service.circuits.pop((arlas, service), None)
+
+    @staticmethod
+    def __cached_response__(url: str, entry: dict) -> requests.Response:
+        r = requests.Response()
+        r.status_code = 200
+        r.reason = "OK (cached)"
+        r.url = url
+        r._content = entry.get("content")
+        return r
+
+    @staticmethod
+    def __identity__(arlas: str, headers: dict[str, str], auth: tuple[str, str | None]) -> str:
+        # The cached responses depend on who is asking: the login and the headers (e.g. organisation filter), but not on the token itself
+        configuration: ARLAS = Configuration.settings.arlas.get(arlas, None) if arlas else None
+        login = configuration.authorization.token_url.login if configuration and configuration.authorization else None
+        return json.dumps([login, auth[0] if auth else None, sorted([[k, v] for (k, v) in headers.items() if k.lower() != "authorization"])])
+
+    @staticmethod
+    def __session__(arlas: str, service: str) -> requests.Session:
+        # One session per configuration and service: the connections are kept alive and reused between the requests
+        with Service.sessions_lock:
+            session = Service.sessions.get((arlas, service))
+            if session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                # Requests stay stateless: cookies are not kept between requests
+                session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+                Service.sessions[(arlas, service)] = session
+            return session
+
     @staticmethod
     def __fetch__(resource: Resource, bytes: bool = False):
         if os.path.exists(resource.location):
@@ -696,7 +1539,7 @@ class Service:
             with open(resource.location, mode) as f:
                 content = f.read()
             return content
-        r: requests.Response = requests.get(resource.location, headers=resource.headers, verify=False)
+        r: requests.Response = Service.__send__(resource.location, "GET", None, resource.headers, None, None, "fetch")
         if r.status_code >= 200 and r.status_code < 300:
             return r.content
         else:
@@ -706,6 +1549,71 @@ class Service:
 
     @staticmethod
     def __get_token__(arlas: str) -> str:
+        # Requests sent concurrently wait for a single token request
+        with Service.tokens_lock:
+            token = Service.tokens.get(arlas)
+            if token is None:
+                token = Service.__read_cached_token__(arlas)
+            if token is None or Service.__token_expires_soon__(token):
+                token = Service.__request_token__(arlas)
+                Service.__write_cached_token__(arlas, token)
+            Service.tokens[arlas] = token
+            return token
+
+    # Forgets the rejected token, unless another request has already replaced it
+    @staticmethod
+    def __forget_token__(arlas: str, rejected: str):
+        with Service.tokens_lock:
+            if Service.tokens.get(arlas, rejected) != rejected:
+                return
+            Service.tokens.pop(arlas, None)
+            path = Service.__token_cache_path__(arlas)
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def __token_expiry__(token: str) -> float | None:
+        try:
+            return jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except jwt.PyJWTError:
+            return None
+
+    @staticmethod
+    def __token_expires_soon__(token: str) -> bool:
+        exp = Service.__token_expiry__(token)
+        return exp is not None and exp - time.time() < TOKEN_EXPIRY_MARGIN
+
+    @staticmethod
+    def __token_cache_path__(arlas: str) -> str:
+        # The credentials are part of the key: a change in the configuration invalidates the cached token
+        auth: AuthorizationService = Configuration.settings.arlas[arlas].authorization
+        key = "|".join([arlas, str(auth.token_url.location), str(auth.token_url.login), str(auth.token_url.password), str(auth.client_id)])
+        return os.path.join(variables["tokens_directory"], hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    @staticmethod
+    def __read_cached_token__(arlas: str) -> str | None:
+        path = Service.__token_cache_path__(arlas)
+        try:
+            with open(path, mode="r", encoding="utf-8") as f:
+                return json.load(f).get("access_token")
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def __write_cached_token__(arlas: str, token: str):
+        # Only tokens with a known expiry are kept between invocations, in a file readable by the user only
+        if Service.__token_expiry__(token) is None:
+            return
+        try:
+            os.makedirs(variables["tokens_directory"], mode=0o700, exist_ok=True)
+            fd = os.open(Service.__token_cache_path__(arlas), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, mode="w", encoding="utf-8") as f:
+                json.dump({"access_token": token}, f)
+        except OSError as e:
+            print("Warning: failed to cache the access token ({})".format(e), file=sys.stderr)
+
+    @staticmethod
+    def __request_token__(arlas: str) -> str:
         auth: AuthorizationService = Configuration.settings.arlas[arlas].authorization
         if auth.arlas_iam:
             data = {
@@ -721,16 +1629,13 @@ class Service:
             }
             if auth.grant_type:
                 data["grant_type"] = auth.grant_type
-        r = requests.post(
-            headers=auth.token_url.headers,
-            data=json.dumps(data),
-            url=auth.token_url.location,
-            verify=False)
+        r = Service.__send__(auth.token_url.location, "POST", codec.dumpb(data), auth.token_url.headers, None, arlas, "authorization")
         if r.status_code >= 200 and r.status_code < 300:
-            if r.json().get("accessToken"):
-                return r.json()["accessToken"]
-            elif r.json().get("access_token"):
-                return r.json()["access_token"]
+            token = codec.loads(r.content)
+            if token.get("accessToken"):
+                return token["accessToken"]
+            elif token.get("access_token"):
+                return token["access_token"]
             else:
                 print("Error: Failed to find access token in response {}".format(r.content), file=sys.stderr)
                 print("   url: {}".format(auth.token_url.location), file=sys.stderr)
@@ -739,3 +1644,60 @@ class Service:
             print("Error: request to get token failed with status {}: {}".format(str(r.status_code), r.content), file=sys.stderr)
             print("   url: {}".format(auth.token_url.location), file=sys.stderr)
             exit(1)
+
+
+# Asynchronous counterpart of the Service calls, for commands sending many requests.
+# The blocking calls run in a thread pool, with at most max_concurrency requests at a time on each host.
+class AsyncService:
+    max_concurrency: int = 8
+    semaphores: dict[str, asyncio.Semaphore] = {}
+
+    @staticmethod
+    def run(coroutine):
+        async def __main__():
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=POOL_MAXSIZE))
+            return await coroutine
+        # Semaphores are bound to the event loop they are used in
+        AsyncService.semaphores = {}
+        return asyncio.run(__main__())
+
+    @staticmethod
+    async def gather(*coroutines):
+        return await asyncio.gather(*coroutines)
+
+    @staticmethod
+    async def __arlas__(arlas: str, suffix, post=None, put=None, patch=None, delete=None, service=Services.arlas_server, exit_on_failure: bool = False, cache: bool = False):
+        async with AsyncService.__semaphore__(arlas, service.value):
+            return await asyncio.to_thread(Service.__arlas__, arlas, suffix, post=post, put=put, patch=patch, delete=delete, service=service, exit_on_failure=exit_on_failure, cache=cache)
+
+    @staticmethod
+    async def __es__(arlas: str, suffix, post=None, put=None, delete=None, exit_on_failure: bool = True, headers: dict[str, str] = {}, cache: bool = False):
+        async with AsyncService.__semaphore__(arlas, "elastic"):
+            return await asyncio.to_thread(Service.__es__, arlas, suffix, post=post, put=put, delete=delete, exit_on_failure=exit_on_failure, headers=headers, cache=cache)
+
+    @staticmethod
+    async def __fetch__(resource: Resource, bytes: bool = False):
+        async with AsyncService.__semaphore__(None, resource.location):
+            return await asyncio.to_thread(Service.__fetch__, resource, bytes=bytes)
+
+    @staticmethod
+    def __semaphore__(arlas: str, service: str) -> asyncio.Semaphore:
+        host = AsyncService.__host__(arlas, service)
+        if host not in AsyncService.semaphores:
+            AsyncService.semaphores[host] = asyncio.Semaphore(AsyncService.max_concurrency)
+        return AsyncService.semaphores[host]
+
+    @staticmethod
+    def __host__(arlas: str, service: str) -> str:
+        configuration: ARLAS = Configuration.settings.arlas.get(arlas, None) if arlas else None
+        location = service
+        if configuration:
+            if service == Services.arlas_server.value and configuration.server:
+                location = configuration.server.location
+            elif service == Services.persistence_server.value and configuration.persistence:
+                location = configuration.persistence.location
+            elif service == Services.iam.value and configuration.authorization:
+                location = configuration.authorization.token_url.location
+            elif service == "elastic" and configuration.elastic:
+                location = configuration.elastic.location
+        return urllib.parse.urlparse(location).netloc or location
@@ -21,12 +21,22 @@ class AuthorizationService(BaseModel):
     arlas_iam: bool | None = Field(default=True, title="Is it an ARLAS IAM service?")
 
 
+class HTTPPolicy(BaseModel):
+    connect_timeout: float | None = Field(default=10, title="Timeout, in seconds, for connecting to a service")
+    read_timeout: float | None = Field(default=300, title="Timeout, in seconds, between two bytes received from a service")
+    retries: int | None = Field(default=3, title="Number of retries of a failed request (idempotent methods, 429, 502, 503, 504)")
+    backoff_factor: float | None = Field(default=0.5, title="The n-th retry waits backoff_factor * 2^n seconds")
+    circuit_breaker_threshold: int | None = Field(default=5, title="Number of consecutive failures after which no request is sent to a service for circuit_breaker_reset seconds: the requests wait, then are tried again")
+    circuit_breaker_reset: float | None = Field(default=30, title="Number of seconds the requests wait before being tried again on a failing service")
+
+
 class ARLAS(BaseModel):
     persistence: Resource | None = Field(title="ARLAS Persistence Server", default=None)
     server: Resource = Field(title="ARLAS Server")
     authorization: AuthorizationService | None = Field(default=None, title="Keycloak URL")
     elastic: Resource | None = Field(default=None, title="dictionary of name/es resources")
     allow_delete: bool | None = Field(default=False, title="Is delete command allowed for this configuration?")
+    http: HTTPPolicy | None = Field(default=None, title="Timeouts, retries and circuit breaker of the requests")
 
 
 class Settings(BaseModel):
@@ -0,0 +1,97 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from prettytable import PrettyTable
+
+# Path segments of the ARLAS APIs that are never names nor identifiers
+API_PATHS = ["explore", "collections", "persist", "resource", "resources", "groups", "organisations", "users", "roles", "permissions"]
+
+
+# Records the HTTP calls sent by the command line: method, url template, status, bytes sent and received, timings and retries.
+# At exit, a summary per url template is printed and the calls can be written as Chrome trace events (chrome://tracing).
+class Trace:
+    enabled: bool = False
+    records: list[dict] = []
+    origin: float = time.time()
+    lock = threading.Lock()
+
+    @staticmethod
+    def record(method: str, url: str, status: int | str, bytes_out: int, bytes_in: int, start: float, ttfb: float, total: float, retries: int = 0):
+        if not Trace.enabled:
+            return
+        with Trace.lock:
+            Trace.records.append({
+                "method": method.upper(),
+                "url": url,
+                "template": Trace.template(url),
+                "status": status,
+                "bytes_out": bytes_out,
+                "bytes_in": bytes_in,
+                "start": start,
+                "ttfb": ttfb,
+                "total": total,
+                "retries": retries,
+                "thread": threading.get_ident()
+            })
+
+    # The url without its query, where the names of indices, collections and the identifiers are replaced by {}
+    @staticmethod
+    def template(url: str) -> str:
+        parsed = urllib.parse.urlparse(url)
+        segments = parsed.path.split("/")
+        for i in range(len(segments)):
+            next_is_action = i + 1 < len(segments) and segments[i + 1].startswith("_")
+            looks_like_id = len(segments[i]) >= 16 and re.search(r"\d", segments[i]) is not None
+            if segments[i] and not segments[i].startswith("_") and segments[i] not in API_PATHS and (next_is_action or looks_like_id):
+                segments[i] = "{}"
+        return parsed.netloc + "/".join(segments)
+
+    @staticmethod
+    def print_summary():
+        if len(Trace.records) == 0:
+            return
+        groups: dict[tuple[str, str], list[dict]] = {}
+        for record in Trace.records:
+            groups.setdefault((record["method"], record["template"]), []).append(record)
+        tab = PrettyTable(["method", "url", "calls", "status", "bytes out", "bytes in", "avg ttfb (ms)", "avg total (ms)", "max total (ms)", "retries"], align="l")
+        for ((method, template), records) in groups.items():
+            statuses = sorted(set(map(lambda r: str(r["status"]), records)))
+            tab.add_row([
+                method,
+                template,
+                len(records),
+                ", ".join(statuses),
+                sum(map(lambda r: r["bytes_out"], records)),
+                sum(map(lambda r: r["bytes_in"], records)),
+                round(1000 * sum(map(lambda r: r["ttfb"], records)) / len(records), 1),
+                round(1000 * sum(map(lambda r: r["total"], records)) / len(records), 1),
+                round(1000 * max(map(lambda r: r["total"], records)), 1),
+                sum(map(lambda r: r["retries"], records))
+            ])
+        print(tab, file=sys.stderr)
+        print("{} request(s), {} ms in requests, {} ms in total".format(
+            len(Trace.records),
+            round(1000 * sum(map(lambda r: r["total"], Trace.records))),
+            round(1000 * (time.time() - Trace.origin))), file=sys.stderr)
+
+    @staticmethod
+    def write_chrome_trace(path: str):
+        events = []
+        for record in Trace.records:
+            events.append({
+                "name": "{} {}".format(record["method"], record["template"]),
+                "cat": "http",
+                "ph": "X",
+                "ts": int(1000000 * (record["start"] - Trace.origin)),
+                "dur": int(1000000 * record["total"]),
+                "pid": os.getpid(),
+                "tid": record["thread"],
+                "args": {k: record[k] for k in ["url", "status", "bytes_out", "bytes_in", "ttfb", "retries"]}
+            })
+        with open(path, mode="w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print("Trace written in {}".format(path), file=sys.stderr)
@@ -0,0 +1,209 @@
+import ipaddress
+import re
+from typing import Callable
+import dateutil.parser as date_parser
+
+INTEGER_RANGES = {
+    "byte": (-2**7, 2**7 - 1),
+    "short": (-2**15, 2**15 - 1),
+    "integer": (-2**31, 2**31 - 1),
+    "long": (-2**63, 2**63 - 1),
+    "unsigned_long": (0, 2**64 - 1),
+}
+FLOAT_TYPES = ["float", "double", "half_float", "scaled_float"]
+STRING_TYPES = ["keyword", "text", "wildcard", "constant_keyword", "match_only_text", "search_as_you_type"]
+ISO_DATE_FORMATS = ["strict_date_optional_time", "date_optional_time", "strict_date_time", "date_time"]
+WKT_TYPES = ("POINT", "LINESTRING", "POLYGON", "MULTIPOINT", "MULTILINESTRING", "MULTIPOLYGON", "GEOMETRYCOLLECTION", "BBOX")
+GEOJSON_TYPES = ["point", "multipoint", "linestring", "multilinestring", "polygon", "multipolygon", "geometrycollection", "envelope"]
+GEOHASH = re.compile(r"^[0-9b-hjkmnp-z]{1,12}$")
+
+
+# Compiles the properties of an index mapping into a validator.
+# The validator returns None if the document can be indexed, the reason why it would be rejected otherwise.
+def make_validator(properties: dict) -> Callable[[dict], str | None]:
+    checkers = __compile_properties__(properties)
+
+    def validate(doc: dict) -> str | None:
+        if type(doc) is not dict:
+            return "document is not a JSON object"
+        return __check_properties__(checkers, doc, "")
+    return validate
+
+
+def __compile_properties__(properties: dict) -> dict[str, Callable]:
+    checkers = {}
+    for (field, desc) in properties.items():
+        checker = __compile_field__(desc)
+        if checker:
+            checkers[field] = checker
+    return checkers
+
+
+# Returns the function checking a value of the field, or None if the field values are not checked
+def __compile_field__(desc: dict) -> Callable | None:
+    field_type = desc.get("type", "object")
+    if desc.get("ignore_malformed") in [True, "true"]:
+        return None
+    if field_type in ["object", "nested"]:
+        if desc.get("enabled") in [False, "false"]:
+            return None
+        checkers = __compile_properties__(desc.get("properties", {}))
+        return lambda v, path: __check_object__(checkers, v, path)
+    if field_type in INTEGER_RANGES:
+        (lower, upper) = INTEGER_RANGES[field_type]
+        return lambda v, path: __check_values__(v, path, lambda x: __check_integer__(x, lower, upper))
+    if field_type in FLOAT_TYPES:
+        return lambda v, path: __check_values__(v, path, __check_float__)
+    if field_type == "boolean":
+        return lambda v, path: __check_values__(v, path, __check_boolean__)
+    if field_type in STRING_TYPES:
+        return lambda v, path: __check_values__(v, path, __check_string__)
+    if field_type == "date":
+        formats = desc.get("format", "strict_date_optional_time||epoch_millis").split("||")
+        return lambda v, path: __check_values__(v, path, lambda x: __check_date__(x, formats))
+    if field_type == "geo_point":
+        return __check_geo_points__
+    if field_type in ["geo_shape", "shape"]:
+        return lambda v, path: __check_values__(v, path, __check_geo_shape__)
+    if field_type == "ip":
+        return lambda v, path: __check_values__(v, path, __check_ip__)
+    return None
+
+
+def __check_properties__(checkers: dict[str, Callable], doc: dict, path: str) -> str | None:
+    for (field, value) in doc.items():
+        checker = checkers.get(field)
+        if checker and value is not None:
+            error = checker(value, path + field)
+            if error:
+                return error
+    return None
+
+
+def __check_object__(checkers: dict[str, Callable], v, path: str) -> str | None:
+    for o in (v if type(v) is list else [v]):
+        if o is None:
+            continue
+        if type(o) is not dict:
+            return "{}: an object is expected, got {}".format(path, __short__(o))
+        error = __check_properties__(checkers, o, path + ".")
+        if error:
+            return error
+    return None
+
+
+# Checks the value, or every value of an array of values
+def __check_values__(v, path: str, check: Callable) -> str | None:
+    for x in (v if type(v) is list else [v]):
+        if x is not None and not check(x):
+            return "{}: invalid value {}".format(path, __short__(x))
+    return None
+
+
+def __check_integer__(x, lower: int, upper: int) -> bool:
+    if type(x) is bool:
+        return False
+    if type(x) is str:
+        try:
+            x = float(x)
+        except ValueError:
+            return False
+    if type(x) is float and x != x:
+        return False
+    return type(x) in [int, float] and lower <= x <= upper
+
+
+def __check_float__(x) -> bool:
+    if type(x) is bool:
+        return False
+    if type(x) is str:
+        try:
+            float(x)
+            return True
+        except ValueError:
+            return False
+    return type(x) in [int, float]
+
+
+def __check_boolean__(x) -> bool:
+    return type(x) is bool or x in ["true", "false", ""]
+
+
+def __check_string__(x) -> bool:
+    return type(x) in [str, int, float, bool]
+
+
+# Only the epoch and ISO formats are checked, other date patterns are left to elasticsearch
+def __check_date__(x, formats: list[str]) -> bool:
+    if type(x) is bool:
+        return False
+    if type(x) in [int, float]:
+        return any(f in ["epoch_millis", "epoch_second"] for f in formats)
+    if type(x) is not str:
+        return False
+    if any(f not in ISO_DATE_FORMATS + ["epoch_millis", "epoch_second"] for f in formats):
+        return True
+    if any(f in ["epoch_millis", "epoch_second"] for f in formats) and __check_float__(x):
+        return True
+    if any(f in ISO_DATE_FORMATS for f in formats):
+        try:
+            date_parser.isoparse(x)
+            return True
+        except ValueError:
+            return False
+    return False
+
+
+def __check_geo_points__(v, path: str) -> str | None:
+    if __check_geo_point__(v):
+        return None
+    if type(v) is list:
+        return __check_values__(v, path, __check_geo_point__)
+    return "{}: invalid geo_point {}".format(path, __short__(v))
+
+
+def __check_geo_point__(x) -> bool:
+    if type(x) is list:
+        return len(x) in [2, 3] and all(type(c) in [int, float] for c in x) and __check_lat_lon__(x[1], x[0])
+    if type(x) is dict:
+        if "lat" in x and "lon" in x:
+            return __check_float__(x["lat"]) and __check_float__(x["lon"]) and __check_lat_lon__(float(x["lat"]), float(x["lon"]))
+        return str(x.get("type", "")).lower() == "point" and __check_geo_point__(x.get("coordinates"))
+    if type(x) is str:
+        if x.upper().startswith("POINT"):
+            coordinates = x[x.find("(") + 1:x.rfind(")")].split()
+            return len(coordinates) in [2, 3] and all(__check_float__(c) for c in coordinates) and __check_lat_lon__(float(coordinates[1]), float(coordinates[0]))
+        lat_lon = x.split(",")
+        if len(lat_lon) == 2:
+            return __check_float__(lat_lon[0].strip()) and __check_float__(lat_lon[1].strip()) and __check_lat_lon__(float(lat_lon[0]), float(lat_lon[1]))
+        return GEOHASH.match(x) is not None
+    return False
+
+
+def __check_lat_lon__(lat: float, lon: float) -> bool:
+    return -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+# Only the structure is checked, not the validity of the geometry
+def __check_geo_shape__(x) -> bool:
+    if type(x) is dict:
+        t = str(x.get("type", "")).lower()
+        if t == "geometrycollection":
+            return type(x.get("geometries")) is list
+        return t in GEOJSON_TYPES and type(x.get("coordinates")) is list
+    if type(x) is str:
+        return x.lstrip().upper().startswith(WKT_TYPES)
+    return False
+
+
+def __check_ip__(x) -> bool:
+    try:
+        ipaddress.ip_address(x)
+        return True
+    except ValueError:
+        return False
+
+
+def __short__(x) -> str:
+    s = str(x)
+    return s if len(s) < 50 else s[:47] + "..."
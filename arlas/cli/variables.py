@@ -3,5 +3,7 @@ import os
 
 variables = {
     "configuration_file": os.path.join(os.path.expanduser('~'), ".arlas", "cli", "configuration.yaml"),
+    "cache_directory": os.path.join(os.path.expanduser('~'), ".arlas", "cli", "cache"),
+    "tokens_directory": os.path.join(os.path.expanduser('~'), ".arlas", "cli", "tokens"),
     "help_epilog": "See full arlas_cli documentation at https://gisaia.github.io/arlas_cli/"
 }
@@ -13,7 +13,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     packages=setuptools.find_packages(),
     python_requires='>=3.10',
-    py_modules=["arlas.cli.cli", "arlas.cli.collections", "arlas.cli.index", "arlas.cli.settings", "arlas.cli.variables", "arlas.cli.service", "arlas.cli.model_infering", "arlas.cli.configurations", "arlas.cli.persist", "arlas.cli.iam", "arlas.cli.user", "arlas.cli.org", "arlas.cli.arlas_cloud"],
+    py_modules=["arlas.cli.cli", "arlas.cli.collections", "arlas.cli.index", "arlas.cli.settings", "arlas.cli.variables", "arlas.cli.service", "arlas.cli.model_infering", "arlas.cli.configurations", "arlas.cli.persist", "arlas.cli.iam", "arlas.cli.user", "arlas.cli.org", "arlas.cli.arlas_cloud", "arlas.cli.validation", "arlas.cli.cache", "arlas.cli.trace", "arlas.cli.json_stream", "arlas.cli.codec", "arlas.cli.export", "arlas.cli.index_advisor", "arlas.cli.routing"],
     package_dir={'': 'src'},
     install_requires=[
         "click==8.1.7",
@@ -31,5 +31,9 @@ setuptools.setup(
         "python-dateutil==2.8.2",
         "geojson==3.1.0",
         "numpy==1.26.4"
-    ]
+    ],
+    extras_require={
+        "fast": ["orjson==3.9.15"],
+        "parquet": ["pyarrow==16.1.0"]
+    }
 )
@@ -146,6 +146,30 @@ else
     exit 1
 fi
 
+# ----------------------------------------------------------
+echo "TEST add data to ES with validation"
+head -1 tests/sample.json | sed 's/"location":"54.830105,11.131042"/"location":"not a point"/' > /tmp/invalid_sample.json
+python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests create courses_valid --mapping tests/mapping.json
+python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests data courses_valid tests/sample.json /tmp/invalid_sample.json --validate --reject-file /tmp/courses_valid_rejected.json
+sleep 2
+if cmp -s /tmp/invalid_sample.json /tmp/courses_valid_rejected.json && python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests list | grep courses_valid | grep " 100   "; then
+    echo "OK: invalid document rejected, hundred hits found"
+    yes | python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests delete courses_valid
+else
+    echo "ERROR: validation failed"
+    exit 1
+fi
+
+# ----------------------------------------------------------
+echo "TEST export index"
+python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests export courses --slices 2 --output /tmp/courses_export.ndjson
+if [ "$(wc -l < /tmp/courses_export.ndjson)" -eq 200 ] ; then
+    echo "OK: index exported"
+else
+    echo "ERROR: export index failed"
+    exit 1
+fi
+
 # ----------------------------------------------------------
 echo "TEST clone index"
 if python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests clone courses courses2 | grep courses2 ; then
@@ -156,6 +180,46 @@ else
     exit 1
 fi
 
+# ----------------------------------------------------------
+echo "TEST update and delete by query"
+python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests clone courses courses4
+python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests update-by-query courses4 --query '{"match_all": {}}' --script "ctx._source.tagging.checked = true"
+sleep 1
+yes | python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests delete-by-query courses4 --query "tagging.checked:true"
+sleep 1
+if python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests list | grep courses4 | grep " 0   "; then
+    echo "OK: documents updated and deleted"
+    yes | python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests delete courses4
+else
+    echo "ERROR: update or delete by query failed"
+    exit 1
+fi
+
+# ----------------------------------------------------------
+echo "TEST infer mapping and add data to ES in a single pass"
+python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests data courses3 tests/sample.json --create-mapping --nb-lines 200 --field-mapping track.timestamps.center:date-epoch_second
+sleep 2
+if python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests list | grep courses3 | grep " 100   "; then
+    echo "OK: hundred hits found"
+    yes | python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests delete courses3
+else
+    echo "ERROR: hits not found"
+    exit 1
+fi
+
+# ----------------------------------------------------------
+echo "TEST reload data behind an alias"
+python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests reload courses_live tests/sample.json --mapping tests/mapping.json
+sleep 1
+yes | python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests reload courses_live tests/sample.json --delete-old
+if [ "$(python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests list | grep -c courses_live-)" -eq 1 ] ; then
+    echo "OK: alias moved to the reloaded index"
+    yes | python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests delete $(python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml indices --config tests list | grep -o "courses_live-[0-9]*")
+else
+    echo "ERROR: reload failed"
+    exit 1
+fi
+
 
 # ----------------------------------------------------------
 echo "TEST add collection"
@@ -215,6 +279,16 @@ else
     exit 1
 fi
 
+# ----------------------------------------------------------
+echo "TEST export collection"
+python3.10 -m arlas.cli.cli --config-file /tmp/arlas_cli.yaml collections --config tests export courses --output /tmp/courses.ndjson --partitions 2
+if [ -s /tmp/courses.ndjson ] ; then
+    echo "OK: Export collection ok"
+else
+    echo "ERROR: Export collection failed"
+    exit 1
+fi
+
 
 # ----------------------------------------------------------
 echo "TEST delete collection"